@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga de la API de autenticación con baselines de regresión.
+
+Arranca ``main:app`` con uvicorn contra un SQLite temporal (o la base de datos
+de ``--database-url``, p. ej. un Postgres local) salvo que se indique
+``--url``, y lanza con ``httpx`` y concurrencia configurable cuatro
+escenarios seguidos:
+
+- ``register``: altas con emails nuevos (``--users``);
+- ``login``: inicios de sesión repartidos entre esos usuarios;
+- ``me``: ``GET /auth/me`` con access tokens válidos;
+- ``refresh``: rotación de refresh tokens (cada usuario virtual encadena el
+  token que recibe en la respuesta anterior).
+
+Para cada escenario reporta p50/p95/p99, peticiones por segundo y errores.
+El límite de intentos de login se desactiva en el servidor lanzado (todas las
+peticiones salen de la misma IP).
+
+Con ``--save-baseline`` los resultados se guardan en ``--baseline`` (por
+defecto ``benchmarks/baselines/auth_load.json``); en ejecuciones posteriores
+se comparan con él y el script termina con código 1 si algún escenario empeora
+más de ``--threshold`` (p95 mayor o RPS menor). ``--repeat`` repite las
+rondas y compara la mediana, que es mucho menos ruidosa que una sola ronda. Los baselines solo son
+comparables en la misma máquina y con la misma configuración: si cambian la
+concurrencia, el coste de bcrypt o la base de datos, la comparación se omite.
+
+Uso:
+    python benchmarks/auth_load.py --users 200 --requests 1000 --concurrency 32 --save-baseline
+    python benchmarks/auth_load.py --users 200 --requests 1000 --concurrency 32 --threshold 0.15
+    python benchmarks/auth_load.py --database-url postgresql://u:p@localhost/bench --bcrypt-rounds 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parent_dir)
+
+DEFAULT_BASELINE = os.path.join(parent_dir, "benchmarks", "baselines", "auth_load.json")
+SCENARIOS = ("register", "login", "me", "refresh")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API de autenticación")
+    parser.add_argument("--users", type=int, default=100, help="Usuarios registrados (peticiones de register)")
+    parser.add_argument("--requests", type=int, default=500, help="Peticiones por escenario (login, me, refresh)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--bcrypt-rounds", type=int, default=None, help="BCRYPT_ROUNDS del servidor lanzado")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--url", default=None, help="Servidor ya en marcha (http://host:puerto)")
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Guardar los resultados como baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Empeoramiento tolerado (0.2 = 20%%)")
+    parser.add_argument("--repeat", type=int, default=1, help="Rondas completas; se reporta la mediana")
+    return parser.parse_args()
+
+
+def start_server(args) -> subprocess.Popen:
+    if args.database_url:
+        database_url = args.database_url
+    else:
+        database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_auth.db')}"
+    env = dict(os.environ, DATABASE_URL=database_url, LOGIN_RATE_LIMIT_ENABLED="false")
+    if args.bcrypt_rounds is not None:
+        env["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    subprocess.run([sys.executable, "-c", "from database import init_db; init_db()"], cwd=parent_dir, env=env, check=True)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+        cwd=parent_dir, env=env,
+    )
+
+
+async def wait_for_server(client, timeout: float = 30):
+    import httpx
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("El servidor no arrancó a tiempo")
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def format_row(name: str, r) -> str:
+    return (f"   {name:<9} {r['rps']:>9.1f} RPS  p50 {r['p50_ms']:>8.1f} ms  p95 {r['p95_ms']:>8.1f} ms  "
+            f"p99 {r['p99_ms']:>8.1f} ms  errores {r['errors']}")
+
+
+async def drive(concurrency: int, total: int, make_request):
+    """
+    Ejecuta ``make_request(i)`` ``total`` veces con ``concurrency`` usuarios
+    virtuales; cada llamada devuelve True si la respuesta es la esperada.
+    """
+    latencies = []
+    errors = 0
+    next_index = 0
+
+    async def virtual_user():
+        nonlocal errors, next_index
+        while next_index < total:
+            i = next_index
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                ok = await make_request(i)
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user() for _ in range(min(concurrency, total))))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+
+async def run(args):
+    import httpx
+
+    base_url = args.url or f"http://127.0.0.1:{args.port}"
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results = {}
+    run_id = int(time.time())
+    emails = [f"load{run_id}-{i}@example.com" for i in range(args.users)]
+    password = "bench-password"
+    sessions = {}
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        await wait_for_server(client)
+
+        async def register(i):
+            r = await client.post("/auth/register", data={
+                "email": emails[i], "password": password, "nombre_completo": "Load",
+                "apellidos": "Test", "direccion": "-", "edad": 30, "telefono": "1234567890",
+            })
+            return r.status_code == 200
+
+        async def login(i):
+            email = emails[i % len(emails)]
+            r = await client.post("/auth/login", json={"email": email, "password": password})
+            if r.status_code != 200:
+                return False
+            sessions[email] = r.json()
+            return True
+
+        async def me(i):
+            tokens = sessions[active[i % len(active)]]
+            r = await client.get("/auth/me", headers={"Authorization": f"Bearer {tokens['access_token']}"})
+            return r.status_code == 200
+
+        # El refresh token se consume en cada llamada y se sustituye por el
+        # nuevo; un cerrojo por sesión evita presentar dos veces el mismo
+        refresh_locks = {email: asyncio.Lock() for email in emails}
+
+        async def refresh(i):
+            email = active[i % len(active)]
+            async with refresh_locks[email]:
+                r = await client.post(
+                    "/auth/refresh", headers={"Authorization": f"Bearer {sessions[email]['refresh_token']}"})
+                if r.status_code != 200:
+                    return False
+                sessions[email] = r.json()
+                return True
+
+        handlers = {"register": (register, args.users), "login": (login, args.requests),
+                    "me": (me, args.requests), "refresh": (refresh, args.requests)}
+        # Los escenarios no pedidos de los que dependen otros se ejecutan sin medir
+        wanted = set(args.scenarios)
+        setup = {"register": bool(wanted - {"register"}), "login": bool(wanted & {"me", "refresh"})}
+        active = []
+        for name in SCENARIOS:
+            handler, total = handlers[name]
+            if name in wanted:
+                r = results[name] = await drive(args.concurrency, total, handler)
+                print(format_row(name, r))
+            elif setup.get(name):
+                await drive(args.concurrency, args.users, handler)
+            if name == "login":
+                active = list(sessions)
+                if not active and wanted & {"me", "refresh"}:
+                    raise RuntimeError("Ningún inicio de sesión correcto: no se pueden medir me ni refresh")
+    return results
+
+
+def median_results(rounds):
+    """Mediana de cada métrica entre rondas (los errores se suman)"""
+    merged = {}
+    for name in rounds[0]:
+        values = [r[name] for r in rounds]
+        merged[name] = {key: round(statistics.median(v[key] for v in values), 2) for key in values[0]}
+        merged[name]["errors"] = sum(v["errors"] for v in values)
+    return merged
+
+
+def run_config(args):
+    """Parámetros que deben coincidir para que un baseline sea comparable"""
+    from utils.config import settings
+    return {
+        "users": args.users,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "repeat": args.repeat,
+        "bcrypt_rounds": args.bcrypt_rounds if args.bcrypt_rounds is not None else settings.BCRYPT_ROUNDS,
+        "database": "externa" if args.url else ("url" if args.database_url else "sqlite"),
+    }
+
+
+def compare(results, baseline, threshold: float):
+    """Lista de regresiones respecto al baseline"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline["results"].get(name)
+        if previous is None:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {previous['p95_ms']} ms -> {current['p95_ms']} ms")
+        if current["rps"] < previous["rps"] * (1 - threshold):
+            regressions.append(f"{name}: RPS {previous['rps']} -> {current['rps']}")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    config = run_config(args)
+    print(f"Escenarios: {', '.join(args.scenarios)}  Concurrencia: {args.concurrency}  "
+          f"Usuarios: {args.users}  Peticiones: {args.requests}  BCRYPT_ROUNDS: {config['bcrypt_rounds']}")
+
+    server = None if args.url else start_server(args)
+    try:
+        rounds = []
+        for i in range(args.repeat):
+            if args.repeat > 1:
+                print(f"Ronda {i + 1}/{args.repeat}")
+            rounds.append(asyncio.run(run(args)))
+        results = median_results(rounds)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    if args.repeat > 1:
+        print("Mediana:")
+        for name, r in results.items():
+            print(format_row(name, r))
+
+    failed = [name for name, r in results.items() if r["errors"]]
+    if failed:
+        print(f"FALLO: respuestas inesperadas en {', '.join(failed)}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({"created_at": datetime.now().isoformat(), "config": config, "results": results}, f, indent=2)
+        print(f"Baseline guardado en {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print(f"Aviso: el baseline se generó con otra configuración ({baseline.get('config')}); no se compara")
+        else:
+            regressions = compare(results, baseline, args.threshold)
+            if regressions:
+                print(f"FALLO: regresiones de más del {args.threshold:.0%} respecto al baseline")
+                for line in regressions:
+                    print(f"   {line}")
+                sys.exit(1)
+            print(f"OK: sin regresiones de más del {args.threshold:.0%} respecto al baseline")
+    else:
+        print(f"Sin baseline en {args.baseline} (usa --save-baseline para crearlo)")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
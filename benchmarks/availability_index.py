@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark: índice de disponibilidad en memoria vs. consulta SQL indexada.
+
+Crea una base SQLite temporal con reservas sin solapamiento y mide cuánto
+tarda en responder "¿está libre la habitación X en [desde, hasta)?" cada vía.
+
+Uso:
+    python benchmarks/availability_index.py --rooms 500 --bookings-per-room 200 --queries 20000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parent_dir)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark del índice de disponibilidad")
+    parser.add_argument("--rooms", type=int, default=500)
+    parser.add_argument("--bookings-per-room", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def seed_database(rooms: int, bookings_per_room: int, rng: random.Random, start: datetime):
+    from sqlalchemy import insert
+    from database import engine, init_db
+    from models import RoomDB, BookingDB
+
+    init_db()
+    with engine.begin() as conn:
+        conn.execute(insert(RoomDB), [
+            {"Id": i, "Capacidad": rng.randint(1, 6), "Caracteristicas": [], "Ubicacion": f"Piso {i % 10}"}
+            for i in range(1, rooms + 1)
+        ])
+        rows = []
+        for room_id in range(1, rooms + 1):
+            cursor = start
+            for _ in range(bookings_per_room):
+                cursor += timedelta(hours=rng.randint(1, 48))
+                end = cursor + timedelta(hours=rng.randint(12, 96))
+                rows.append({"Room_Id": room_id, "User_Id": 1, "BookingIn": cursor, "BookingOn": end})
+                cursor = end
+        conn.execute(insert(BookingDB), rows)
+    return len(rows)
+
+
+def make_queries(n: int, rooms: int, rng: random.Random, start: datetime, span_hours: int):
+    queries = []
+    for _ in range(n):
+        desde = start + timedelta(hours=rng.randint(0, span_hours))
+        queries.append((rng.randint(1, rooms), desde, desde + timedelta(hours=rng.randint(6, 72))))
+    return queries
+
+
+async def run(args):
+    from database import AsyncSessionLocal, close_db
+    from rooms.availability_index import AvailabilityIndex
+    from rooms.rooms import is_room_available
+
+    rng = random.Random(args.seed)
+    start = datetime.now() + timedelta(days=1)
+    total = seed_database(args.rooms, args.bookings_per_room, rng, start)
+    queries = make_queries(args.queries, args.rooms, rng, start, args.bookings_per_room * 60)
+    print(f"Habitaciones: {args.rooms}  Reservas: {total}  Consultas: {len(queries)}")
+
+    index = AvailabilityIndex(max_age=3600)
+    async with AsyncSessionLocal() as db:
+        t0 = time.perf_counter()
+        await index.reload(db)
+        load_time = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        index_results = [index.is_available(r, a, b) for r, a, b in queries]
+        index_time = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        sql_results = [await is_room_available(db, r, a, b) for r, a, b in queries]
+        sql_time = time.perf_counter() - t0
+
+    await close_db()
+
+    mismatches = sum(1 for x, y in zip(index_results, sql_results) if x != y)
+    print(f"Carga del índice: {load_time * 1000:.1f} ms")
+    print(f"Índice en memoria: {index_time / len(queries) * 1e6:8.2f} us/consulta  ({len(queries) / index_time:,.0f} consultas/s)")
+    print(f"Consulta SQL:      {sql_time / len(queries) * 1e6:8.2f} us/consulta  ({len(queries) / sql_time:,.0f} consultas/s)")
+    print(f"Aceleración: x{sql_time / index_time:.1f}  Discrepancias: {mismatches}")
+    return mismatches == 0
+
+
+def main():
+    args = parse_args()
+    db_path = os.path.join(tempfile.mkdtemp(), "bench_availability.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    ok = asyncio.run(run(args))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark del filtrado por IP y de la comprobación de orígenes CORS.
+
+Compara, para listas de CIDRs de distintos tamaños, la búsqueda binaria de
+``CIDRMatcher`` con el recorrido lineal de redes de ``ipaddress`` (IPs siempre
+nuevas, sin caché), mide el coste de ``IPFilterMiddleware`` por petición con
+clientes que se repiten (descontando una app ASGI vacía) y la búsqueda de un
+origen en una lista frente a un ``frozenset``.
+
+Uso:
+    python benchmarks/ip_filter.py --cidrs 10 1000 10000 --lookups 200000
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import os
+import random
+import sys
+import time
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parent_dir)
+
+from utils.config import settings
+from utils.ip_filter import CIDRMatcher, IPFilterMiddleware
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Micro-benchmark del filtrado por IP")
+    parser.add_argument("--cidrs", type=int, nargs="+", default=[2, 100, 10000])
+    parser.add_argument("--lookups", type=int, default=200000)
+    parser.add_argument("--clients", type=int, default=5000, help="IPs de cliente distintas en el middleware")
+    parser.add_argument("--seed", type=int, default=11)
+    return parser.parse_args()
+
+
+def random_cidrs(rng: random.Random, count: int):
+    return [f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.0/{rng.choice([16, 20, 24, 28])}"
+            for _ in range(count)]
+
+
+def per_call_ns(fn, items) -> float:
+    started = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - started) / len(items) * 1e9
+
+
+def bench_matchers(args, rng):
+    ips = [f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}"
+           for _ in range(args.lookups)]
+    print(f"{'CIDRs':>8} {'CIDRMatcher':>14} {'ipaddress lineal':>18}  (IP nueva en cada búsqueda)")
+    for count in args.cidrs:
+        cidrs = random_cidrs(rng, count)
+        matcher = CIDRMatcher(cidrs)
+        networks = [ipaddress.ip_network(c, strict=False) for c in cidrs]
+        compiled = per_call_ns(matcher.__contains__, ips)
+        # El recorrido lineal es muy lento con listas grandes: menos muestras
+        sample = ips[: max(1000, args.lookups // max(1, count // 10))]
+        linear = per_call_ns(lambda ip: any(ipaddress.ip_address(ip) in n for n in networks), sample)
+        print(f"{count:>8} {compiled:>11.0f} ns {linear:>15.0f} ns")
+
+
+def bench_middleware(args, rng):
+    async def app(scope, receive, send):
+        pass
+
+    async def send(message):
+        pass
+
+    # Tráfico realista: un conjunto acotado de clientes que se repiten
+    clients = [f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}"
+               for _ in range(args.clients)]
+    allowed = random_cidrs(rng, 1000) + [f"{ip}/32" for ip in clients]
+    variants = {
+        "sin filtros": IPFilterMiddleware(app),
+        "deny 1000": IPFilterMiddleware(app, denied=random_cidrs(rng, 1000)),
+        "deny + allowlist 1000": IPFilterMiddleware(
+            app, denied=random_cidrs(rng, 1000), allowed=allowed, mode="allowlist"),
+        "proxy + deny + allowlist": IPFilterMiddleware(
+            app, denied=random_cidrs(rng, 1000), allowed=allowed, mode="allowlist",
+            trusted_proxies=["10.0.0.0/8"]),
+    }
+    requests = [rng.choice(clients) for _ in range(args.lookups)]
+
+    async def timed(handler, proxied: bool) -> float:
+        headers_for = {
+            ip: [(b"host", b"api"), (b"x-forwarded-for", ip.encode())] if proxied else [(b"host", b"api")]
+            for ip in clients
+        }
+        started = time.perf_counter()
+        for ip in requests:
+            scope = {"type": "http", "path": "/rooms", "headers": headers_for[ip],
+                     "client": ("10.0.0.1", 5000) if proxied else (ip, 5000)}
+            await handler(scope, None, send)
+        return (time.perf_counter() - started) / len(requests) * 1e9
+
+    print(f"\nMiddleware por petición ({args.clients} clientes distintos), descontando la app vacía:")
+    for name, middleware in variants.items():
+        proxied = middleware.behind_proxy
+        base = asyncio.run(timed(app, proxied))
+        total = asyncio.run(timed(middleware, proxied))
+        print(f"   {name:<26} {total - base:>6.0f} ns")
+
+
+def bench_origins(args):
+    origins = list(settings.ALLOWED_ORIGINS)
+    as_set = frozenset(origins)
+    probe = ["https://evil.example.com"] * args.lookups
+    print(f"\nOrigen CORS ({len(origins)} orígenes, caso peor: no permitido)")
+    print(f"   lista:     {per_call_ns(lambda o: o in origins, probe):.0f} ns")
+    print(f"   frozenset: {per_call_ns(lambda o: o in as_set, probe):.0f} ns")
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    bench_matchers(args, rng)
+    bench_middleware(args, rng)
+    bench_origins(args)
+
+
+if __name__ == "__main__":
+    main()
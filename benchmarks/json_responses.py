@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark de la serialización de respuestas.
+
+Compara, para las respuestas de ``/auth/me``, ``/auth/register`` y una página
+de ``/auth/admin/users``, tres formas de responder:
+
+- ``dict``: diccionario construido a mano con ``response_model=Dict[str, Any]``
+  y ``JSONResponse`` (como estaban las rutas de autenticación);
+- ``tipado``: esquema Pydantic como ``response_model`` y ``JSONResponse``;
+- ``tipado+orjson``: esquema Pydantic y ``ORJSONResponse`` (la configuración
+  actual de ``main.py``).
+
+Para cada una mide la construcción del contenido + validación/serialización
+de FastAPI + render del cuerpo (``serialization``), y una petición completa a
+una app ASGI mínima sin base de datos ni middlewares (``request``).
+
+Uso:
+    python benchmarks/json_responses.py --iterations 20000 --page-size 100
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parent_dir)
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+
+from models import UserPrincipal
+from routes.auth import RegisterOut, UserPage, UserSummary
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Micro-benchmark de serialización de respuestas")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--page-size", type=int, default=100, help="Usuarios por página del listado")
+    return parser.parse_args()
+
+
+def make_user(i: int) -> UserPrincipal:
+    return UserPrincipal(
+        id=i, email=f"user{i}@example.com", role="clientes", is_authorized=True,
+        nombre_completo="Nombre", apellidos="Apellido Apellido", direccion="Calle Mayor 1",
+        edad=30, telefono="1234567890", created_at=datetime(2025, 1, 1, 12, 30, 15, 123456),
+    )
+
+
+def user_dict(user: UserPrincipal) -> Dict[str, Any]:
+    return {
+        "id": user.id,
+        "email": user.email,
+        "nombre_completo": user.nombre_completo,
+        "apellidos": user.apellidos,
+        "direccion": user.direccion,
+        "edad": user.edad,
+        "telefono": user.telefono,
+        "role": user.role,
+        "is_authorized": user.is_authorized,
+        "created_at": user.created_at.isoformat()
+    }
+
+
+def build_cases(page_size: int):
+    """{endpoint: {variante: (response_model, clase de respuesta, constructor del contenido)}}"""
+    user = make_user(1)
+    page = [make_user(i) for i in range(page_size)]
+    return {
+        "me": {
+            "dict": (Dict[str, Any], JSONResponse, lambda: user_dict(user)),
+            "tipado": (UserPrincipal, JSONResponse, lambda: user),
+            "tipado+orjson": (UserPrincipal, ORJSONResponse, lambda: user),
+        },
+        "register": {
+            "dict": (Dict[str, Any], JSONResponse, lambda: {
+                "message": "Usuario registrado exitosamente como cliente.",
+                "user": {key: value for key, value in user_dict(user).items()
+                         if key not in ("direccion", "edad", "telefono")},
+            }),
+            "tipado": (RegisterOut, JSONResponse, lambda: RegisterOut(
+                message="Usuario registrado exitosamente como cliente.", user=UserSummary.model_validate(user))),
+            "tipado+orjson": (RegisterOut, ORJSONResponse, lambda: RegisterOut(
+                message="Usuario registrado exitosamente como cliente.", user=UserSummary.model_validate(user))),
+        },
+        f"users[{page_size}]": {
+            "dict": (Dict[str, Any], JSONResponse, lambda: {
+                "items": [user_dict(u) for u in page], "next_cursor": page_size}),
+            "tipado": (UserPage, JSONResponse, lambda: UserPage(items=page, next_cursor=page_size)),
+            "tipado+orjson": (UserPage, ORJSONResponse, lambda: UserPage(items=page, next_cursor=page_size)),
+        },
+    }
+
+
+def build_app(response_model, response_class, make_content) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/bench", response_model=response_model, response_class=response_class)
+    async def endpoint():
+        return make_content()
+
+    return app
+
+
+async def time_serialization(app: FastAPI, make_content, iterations: int) -> float:
+    route = next(r for r in app.routes if getattr(r, "path", None) == "/bench")
+    field, response_class = route.response_field, route.response_class
+    started = time.perf_counter()
+    for _ in range(iterations):
+        content = await serialize_response(field=field, response_content=make_content())
+        response_class(content)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def time_request(app: FastAPI, iterations: int) -> float:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/bench", "raw_path": b"/bench", "root_path": "",
+        "query_string": b"", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1),
+        "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    # El primer paso construye la pila de middlewares de Starlette
+    await app({**scope, "state": {}}, receive, send)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await app({**scope, "state": {}}, receive, send)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def run(args):
+    print(f"{'respuesta':<12} {'variante':<15} {'serialization':>14} {'request':>12} {'bytes':>8}")
+    for endpoint, variants in build_cases(args.page_size).items():
+        baseline = None
+        iterations = args.iterations if not endpoint.startswith("users") else max(1, args.iterations // 20)
+        for name, (response_model, response_class, make_content) in variants.items():
+            app = build_app(response_model, response_class, make_content)
+            route = next(r for r in app.routes if getattr(r, "path", None) == "/bench")
+            body = response_class(await serialize_response(
+                field=route.response_field, response_content=make_content())).body
+            serialization = await time_serialization(app, make_content, iterations)
+            request = await time_request(app, iterations)
+            baseline = baseline or serialization
+            print(f"{endpoint:<12} {name:<15} {serialization:>11.1f} µs {request:>9.1f} µs {len(body):>8}"
+                  f"   x{baseline / serialization:.2f}")
+
+
+def main():
+    args = parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
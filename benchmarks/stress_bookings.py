@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Prueba de estrés: miles de reservas concurrentes y solapadas sobre pocas
+habitaciones. Verifica que ninguna pareja de reservas activas se solape y
+reporta el throughput.
+
+Con ``--processes N`` se lanzan N procesos contra la misma base de datos para
+ejercitar también el bloqueo entre procesos. Sin ``--database-url`` se usa un
+SQLite temporal.
+
+Uso:
+    python benchmarks/stress_bookings.py --requests 2000 --rooms 5 --processes 2
+    python benchmarks/stress_bookings.py --database-url postgresql://u:p@localhost/bench
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parent_dir)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Prueba de estrés de reservas concurrentes")
+    parser.add_argument("--requests", type=int, default=2000, help="Reservas por proceso")
+    parser.add_argument("--rooms", type=int, default=5)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=200, help="Peticiones simultáneas por proceso")
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--seed", type=int, default=7)
+    return parser.parse_args()
+
+
+def setup_database(rooms: int):
+    from sqlalchemy import insert
+    from database import engine, init_db
+    from models import User, RoomDB, BookingDB
+
+    init_db()
+    with engine.begin() as conn:
+        conn.execute(BookingDB.__table__.delete())
+        conn.execute(RoomDB.__table__.delete())
+        conn.execute(User.__table__.delete().where(User.email == "stress@example.com"))
+        user_id = conn.execute(insert(User).returning(User.id), [{
+            "email": "stress@example.com", "password_hash": "x", "nombre_completo": "Stress",
+            "apellidos": "Test", "direccion": "-", "edad": 30, "telefono": "1234567890",
+            "role": "clientes", "is_authorized": True, "created_at": datetime.now(),
+        }]).scalar_one()
+        conn.execute(insert(RoomDB), [
+            {"Id": i, "Capacidad": 2, "Caracteristicas": [], "Ubicacion": "Stress"}
+            for i in range(1, rooms + 1)
+        ])
+    return user_id
+
+
+async def fire(args, worker: int, user_id: int, base: datetime):
+    from database import AsyncSessionLocal, close_db
+    from rooms.reservations import create_booking_safe, BookingConflictError
+
+    rng = random.Random(args.seed + worker)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    counts = {"ok": 0, "conflict": 0, "error": 0}
+
+    async def one():
+        room_id = rng.randint(1, args.rooms)
+        # Ventanas cortas sobre un rango pequeño: la mayoría se solapan
+        desde = base + timedelta(hours=rng.randint(0, 24 * 14))
+        hasta = desde + timedelta(hours=rng.randint(1, 48))
+        async with semaphore:
+            async with AsyncSessionLocal() as db:
+                try:
+                    await create_booking_safe(db, user_id, room_id, desde, hasta)
+                    counts["ok"] += 1
+                except BookingConflictError:
+                    counts["conflict"] += 1
+                except Exception as e:
+                    counts["error"] += 1
+                    print(f"[{worker}] Error: {e}")
+
+    await asyncio.gather(*(one() for _ in range(args.requests)))
+    await close_db()
+    return counts
+
+
+def run_worker(args, worker: int, user_id: int, base: datetime, queue):
+    queue.put(asyncio.run(fire(args, worker, user_id, base)))
+
+
+def count_overlaps() -> int:
+    from sqlalchemy import select, func, and_
+    from sqlalchemy.orm import aliased
+    from database import engine
+    from models import BookingDB, BOOKING_INACTIVE_STATES
+
+    a, b = aliased(BookingDB), aliased(BookingDB)
+    query = select(func.count()).select_from(a).join(b, and_(
+        a.Room_Id == b.Room_Id,
+        a.Id < b.Id,
+        a.BookingIn < b.BookingOn,
+        b.BookingIn < a.BookingOn,
+        a.Estado.notin_(BOOKING_INACTIVE_STATES),
+        b.Estado.notin_(BOOKING_INACTIVE_STATES),
+    ))
+    with engine.connect() as conn:
+        return conn.execute(query).scalar_one()
+
+
+def main():
+    args = parse_args()
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        db_path = os.path.join(tempfile.mkdtemp(), "stress_bookings.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+    user_id = setup_database(args.rooms)
+    base = datetime.now() + timedelta(days=1)
+
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    started = time.perf_counter()
+    workers = [ctx.Process(target=run_worker, args=(args, i, user_id, base, queue)) for i in range(args.processes)]
+    for p in workers:
+        p.start()
+    results = [queue.get() for _ in workers]
+    for p in workers:
+        p.join()
+    elapsed = time.perf_counter() - started
+
+    totals = {key: sum(r[key] for r in results) for key in ("ok", "conflict", "error")}
+    total = sum(totals.values())
+    overlaps = count_overlaps()
+
+    print(f"Peticiones: {total}  Procesos: {args.processes}  Habitaciones: {args.rooms}")
+    print(f"Creadas: {totals['ok']}  Conflictos (409): {totals['conflict']}  Errores: {totals['error']}")
+    print(f"Tiempo: {elapsed:.2f} s  Throughput: {total / elapsed:,.0f} peticiones/s")
+    print(f"Reservas solapadas en la base de datos: {overlaps}")
+
+    if overlaps or totals["error"]:
+        print("FALLO: se detectaron solapamientos o errores")
+        sys.exit(1)
+    print("OK: ninguna reserva solapada")
+
+
+if __name__ == "__main__":
+    main()
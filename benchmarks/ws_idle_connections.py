@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga: conexiones WebSocket inactivas por worker.
+
+Arranca ``main:app`` con uvicorn (un worker, SQLite temporal) salvo que se
+indique ``--url``, abre N conexiones autenticadas a ``/notifications/ws``, las
+mantiene abiertas y reporta la tasa de conexión y la memoria residente del
+servidor por conexión.
+
+Para decenas de miles de conexiones hay que subir el límite de descriptores
+(``ulimit -n``) y, si hace falta, el rango de puertos efímeros del sistema.
+
+Uso:
+    python benchmarks/ws_idle_connections.py --connections 20000 --hold 30
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parent_dir)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Conexiones WebSocket inactivas por worker")
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=1000, help="Usuarios distintos entre los que se reparten")
+    parser.add_argument("--batch", type=int, default=500, help="Conexiones abiertas en paralelo")
+    parser.add_argument("--hold", type=float, default=10, help="Segundos con todas las conexiones abiertas")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url", default=None, help="Servidor ya en marcha (ws://host:puerto)")
+    return parser.parse_args()
+
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+def rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def start_server(port: int) -> subprocess.Popen:
+    db_path = os.path.join(tempfile.mkdtemp(), "bench_ws.db")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}")
+    subprocess.run([sys.executable, "-c", "from database import init_db; init_db()"], cwd=parent_dir, env=env, check=True)
+    # El servidor hereda el límite de descriptores ya elevado
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+         "--log-level", "warning", "--ws-ping-interval", "0"],
+        cwd=parent_dir, env=env,
+    )
+
+
+async def wait_for_server(base_http: str, timeout: float = 30):
+    import httpx
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{base_http}/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("El servidor no arrancó a tiempo")
+
+
+async def run(args, server_pid):
+    import websockets
+    from utils.auth import create_access_token
+
+    base_ws = args.url or f"ws://127.0.0.1:{args.port}"
+    if server_pid is not None:
+        await wait_for_server(base_ws.replace("ws://", "http://"))
+
+    tokens = [
+        create_access_token({"sub": str(uid), "email": f"user{uid}@example.com", "role": "clientes"})
+        for uid in range(1, args.users + 1)
+    ]
+    base_rss = rss_mb(server_pid) if server_pid else None
+
+    connections = []
+    failures = 0
+    started = time.perf_counter()
+    for offset in range(0, args.connections, args.batch):
+        size = min(args.batch, args.connections - offset)
+        results = await asyncio.gather(*(
+            websockets.connect(
+                f"{base_ws}/notifications/ws?token={tokens[(offset + i) % len(tokens)]}",
+                ping_interval=None, open_timeout=60,
+            )
+            for i in range(size)
+        ), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                failures += 1
+            else:
+                connections.append(result)
+    connect_time = time.perf_counter() - started
+
+    print(f"Conexiones abiertas: {len(connections)}  Fallidas: {failures}")
+    print(f"Tiempo de conexión: {connect_time:.1f} s  ({len(connections) / connect_time:,.0f} conexiones/s)")
+    if server_pid:
+        rss = rss_mb(server_pid)
+        per_conn = (rss - base_rss) * 1024 / max(len(connections), 1)
+        print(f"RSS del servidor: {base_rss:.1f} MB -> {rss:.1f} MB  (~{per_conn:.1f} KB por conexión)")
+
+    await asyncio.sleep(args.hold)
+    alive = sum(1 for ws in connections if ws.state.name == "OPEN")
+    print(f"Conexiones abiertas tras {args.hold:.0f} s inactivas: {alive}")
+
+    await asyncio.gather(*(ws.close() for ws in connections), return_exceptions=True)
+    return failures == 0 and alive == len(connections)
+
+
+def main():
+    args = parse_args()
+    limit = raise_fd_limit()
+    if args.connections + 100 > limit:
+        print(f"Aviso: el límite de descriptores ({limit}) es menor que las conexiones pedidas")
+
+    server = None if args.url else start_server(args.port)
+    try:
+        ok = asyncio.run(run(args, server.pid if server else None))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from utils.config import settings
+from utils.metrics import instrument_engine
 
 # Base para los modelos
 Base = declarative_base()
@@ -9,14 +12,60 @@ Base = declarative_base()
 # Configuración de la base de datos
 DATABASE_URL = settings.DATABASE_URL
 
+# Drivers asíncronos por backend
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+def _async_database_url(url: str) -> str:
+    """Deriva la URL asíncrona a partir de la URL síncrona"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No hay driver asíncrono configurado para '{backend}'")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+def _engine_options(url: str) -> dict:
+    """Opciones del pool de conexiones comunes a ambos engines"""
+    options = {
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+    # SQLite en memoria usa un pool de una sola conexión sin tamaño configurable
+    if make_url(url).database not in (None, '', ':memory:'):
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+    return options
+
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or _async_database_url(DATABASE_URL)
+
 # Crear el engine
 if DATABASE_URL.startswith('sqlite'):
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+    engine = create_engine(
+        DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        **_engine_options(DATABASE_URL)
+    )
 else:
-    engine = create_engine(DATABASE_URL)
+    engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+
+# Engine asíncrono para las rutas de FastAPI
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_options(ASYNC_DATABASE_URL))
+
+# Número y tiempo de consultas por petición para /metrics
+if settings.METRICS_ENABLED:
+    instrument_engine(engine)
+    instrument_engine(async_engine.sync_engine)
 
 # Crear sessionmaker
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
 
 # Dependencia para obtener la sesión de base de datos
 def get_db():
@@ -26,9 +75,40 @@ def get_db():
     finally:
         db.close()
 
+# Dependencia asíncrona para las rutas
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # Función para inicializar la base de datos
 def init_db():
     """Crear todas las tablas"""
     # Importar aquí para evitar import circular
-    from models import User  
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    from models import User, RoomDB, BookingDB, NotificationDB, NotificationCounterDB, RevokedTokenDB
+    Base.metadata.create_all(bind=engine)
+
+def _pool_stats(pool) -> dict:
+    """Conexiones del pool; los pools sin tamaño (SQLite en memoria) solo informan su tipo"""
+    stats = {"pool": type(pool).__name__}
+    if hasattr(pool, "checkedout"):
+        max_overflow = getattr(pool, "_max_overflow", 0)
+        # max_overflow < 0 (DB_MAX_OVERFLOW=-1): desbordamiento ilimitado, nunca se satura
+        capacity = None if max_overflow < 0 else pool.size() + max_overflow
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+            capacity=capacity,
+            saturated=bool(capacity) and pool.checkedout() >= capacity,
+        )
+    return stats
+
+def pool_stats() -> dict:
+    """Estado de los pools de ambos engines"""
+    return {"async": _pool_stats(async_engine.pool), "sync": _pool_stats(engine.pool)}
+
+async def close_db():
+    """Cerrar los pools de conexiones"""
+    await async_engine.dispose()
+    engine.dispose()
@@ -1,23 +1,118 @@
 from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from datetime import datetime
-from app.core import settings  
-from app.routers.auth import router as auth_router
-from app.routers.notifications import router as notifications_router
+from utils.config import settings
+from utils.hashing import password_hasher
+from utils.ip_filter import IPFilterMiddleware, SetCORSMiddleware
+from utils.metrics import MetricsMiddleware, metrics
+from utils.auth import token_cache_stats
+from database import close_db, AsyncSessionLocal
+from routes.auth import router as auth_router
+from routers.notifications import router as notifications_router
+from rooms.rooms import router as rooms_router, bookings_router
+from rooms.availability_index import availability_index
+from utils.notification_outbox import notification_outbox
+from utils.email_filter import email_filter
+from utils.token_store import refresh_token_store
+from utils.loop_monitor import loop_monitor
+from utils.readiness import readiness_probe
 
-app = FastAPI(title="Api Booking")
+# orjson serializa las respuestas varias veces más rápido que json de la stdlib
+app = FastAPI(title="Api Booking", default_response_class=ORJSONResponse)
 app.version = "1.0.0"
 
 app.add_middleware(
-    CORSMiddleware,
+    SetCORSMiddleware,
     allow_origins=settings.ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
+# Añadido el último: se ejecuta primero y resuelve la IP real del cliente
+app.add_middleware(
+    IPFilterMiddleware,
+    allowed=settings.ALLOWED_CIDRS,
+    denied=settings.DENIED_CIDRS,
+    trusted_proxies=settings.TRUSTED_PROXIES,
+    mode=settings.IP_FILTER_MODE,
+    paths=settings.IP_FILTER_PATHS,
+)
+
+# El más externo: la latencia medida incluye el resto de middlewares
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, server_timing=settings.SERVER_TIMING_ENABLED)
+
 app.include_router(auth_router)
 app.include_router(notifications_router)  
+app.include_router(rooms_router)
+app.include_router(bookings_router)
+
+@app.on_event("startup")
+async def load_availability_index():
+    if not settings.AVAILABILITY_INDEX_ENABLED:
+        return
+    try:
+        async with AsyncSessionLocal() as db:
+            await availability_index.reload(db)
+    except Exception as e:
+        # Sin índice las consultas recurren a la base de datos
+        print(f"No se pudo cargar el índice de disponibilidad: {e}")
+
+@app.on_event("startup")
+async def load_email_filter():
+    try:
+        async with AsyncSessionLocal() as db:
+            await email_filter.reload(db)
+    except Exception as e:
+        # Sin filtro el registro siempre hace la consulta previa
+        print(f"No se pudo cargar el filtro de emails: {e}")
+
+@app.on_event("startup")
+async def load_revoked_tokens():
+    if not refresh_token_store.persist:
+        return
+    try:
+        async with AsyncSessionLocal() as db:
+            await refresh_token_store.load(db)
+    except Exception as e:
+        print(f"No se pudieron cargar los tokens revocados: {e}")
+    refresh_token_store.start()
+
+@app.on_event("startup")
+async def start_notification_worker():
+    if settings.NOTIFICATIONS_WORKER_ENABLED:
+        notification_outbox.start()
+
+@app.on_event("startup")
+async def start_loop_monitor():
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+
+@app.on_event("shutdown")
+async def shutdown_resources():
+    # Las sondas responden 503 mientras se cierran los recursos
+    readiness_probe.shutting_down = True
+    await loop_monitor.stop()
+    await notification_outbox.stop()
+    await refresh_token_store.stop()
+    password_hasher.shutdown()
+    await close_db()
+
+if settings.METRICS_ENABLED:
+    metrics.gauge("password_hash_in_flight", "Operaciones de hashing en curso o en cola",
+                  lambda: password_hasher.stats()["in_flight"])
+    metrics.gauge("password_hash_queue_depth", "Operaciones de hashing esperando un hilo",
+                  lambda: password_hasher.queue_depth)
+    metrics.gauge("password_hash_rejected", "Operaciones de hashing rechazadas por cola llena",
+                  lambda: password_hasher.stats()["rejected"])
+    metrics.gauge("token_cache_hit_ratio", "Proporción de aciertos de la caché de tokens verificados",
+                  lambda: token_cache_stats()["hit_ratio"])
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics_endpoint():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def read_root():
     return {"Api Booking": app.version}
@@ -30,4 +125,12 @@ async def health_check():
         "timestamp": datetime.now().astimezone().isoformat(),
         "uptime": "Service is running",
         "environment": "production",
+        "hashing": password_hasher.stats(),
+        "event_loop": loop_monitor.stats(),
     }
+
+@app.get("/ready")
+async def readiness_check():
+    """Disponibilidad para el balanceador: 503 si este worker no debe recibir tráfico"""
+    report = await readiness_probe.check()
+    return ORJSONResponse(report, status_code=200 if report["ready"] else 503)
@@ -1,15 +1,17 @@
 # Clases de modelos para la aplicación de reservas de habitaciones
 # Clases base: User, Booking, Room, Notification 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import  Optional, List
 from datetime import datetime
 from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Enum
-from sqlalchemy.orm import relationship
-import bcrypt
+from sqlalchemy import JSON, Index, CheckConstraint, DDL
+from sqlalchemy import event, inspect, func
+from sqlalchemy.orm import relationship, Session
 import enum
 
 # Importar Base desde database para evitar imports circulares
 from database import Base
+from utils.passwords import hash_password, verify_password
 
 #User
 class User(Base):
@@ -23,62 +25,253 @@ class User(Base):
     direccion = Column(String(255), nullable=False)
     edad = Column(Integer, nullable=False)
     telefono = Column(String(20), nullable=False)
-    role = Column(String(20), nullable=False, default="clientes", index=True)
+    role = Column(String(20), nullable=False, default="clientes")
     is_authorized = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime, default=datetime.now, nullable=False)
 
+    __table_args__ = (
+        # Listados por rol paginados por id: el índice entrega las filas ya
+        # ordenadas y cada página empieza donde terminó la anterior
+        Index('ix_users_role_id', 'role', 'id'),
+    )
+
     def set_password(self, raw_password: str):
-        # Convertir la contraseña a bytes y generar hash
-        password_bytes = raw_password.encode('utf-8')
-        salt = bcrypt.gensalt()
-        self.password_hash = bcrypt.hashpw(password_bytes, salt).decode('utf-8')
+        self.password_hash = hash_password(raw_password)
 
     def check_password(self, raw_password: str) -> bool:
-        # Verificar la contraseña
+        return self.verify_and_update(raw_password)[0]
+
+    def verify_and_update(self, raw_password: str):
+        """
+        Verifica la contraseña y, si el hash usa parámetros obsoletos, lo
+        reemplaza por uno con la política actual. Devuelve (válida, rehasheado).
+        """
         try:
-            # Validar que el hash existe y no está vacío
-            if not self.password_hash:
-                return False
-            
-            # Validar que el hash tiene el formato correcto de bcrypt
-            if not (self.password_hash.startswith('$2a$') or 
-                    self.password_hash.startswith('$2b$') or 
-                    self.password_hash.startswith('$2y$')):
-                return False
-            
-            # Validar que el hash tiene la longitud correcta (60 caracteres)
-            if len(self.password_hash) != 60:
-                return False
-                
-            password_bytes = raw_password.encode('utf-8')
-            hash_bytes = self.password_hash.encode('utf-8')
-            return bcrypt.checkpw(password_bytes, hash_bytes)
-            
+            valid, new_hash = verify_password(raw_password, self.password_hash)
         except ValueError as e:
-            # Log del error para debugging
+            # Hash con formato desconocido o corrupto
             print(f"Error de validación de contraseña para usuario {self.email}: {e}")
-            return False
+            return False, False
         except Exception as e:
             # Log de cualquier otro error
             print(f"Error inesperado al validar contraseña para usuario {self.email}: {e}")
-            return False
+            return False, False
+        if valid and new_hash:
+            self.password_hash = new_hash
+            return True, True
+        return valid, False
         
     def to_dict(self):
-        return {
-            'id': self.id,
-            'email': self.email,
-            'nombre_completo': self.nombre_completo,
-            'apellidos': self.apellidos,
-            'direccion': self.direccion,
-            'edad': self.edad,
-            'telefono': self.telefono,
-            'role': self.role,
-            "created_at": self.created_at.isoformat() if hasattr(self, 'created_at') else None
-        }
+        # Misma serialización que las respuestas de la API
+        return UserPrincipal.model_validate(self).model_dump(mode="json", exclude={"is_authorized"})
 
     def __repr__(self):
         return f"User('{self.nombre_completo} {self.apellidos}', '{self.email}'), role='{self.role}')"
 
+# Invalidar la caché de usuarios cuando cambian el rol o la autorización.
+# Los ids se acumulan durante el flush y se invalidan tras el commit para que
+# ninguna petición concurrente vuelva a cachear el valor anterior.
+@event.listens_for(User, "after_update")
+def _track_user_auth_changes(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.role.history.has_changes() or state.attrs.is_authorized.history.has_changes():
+        state.session.info.setdefault("invalidated_users", set()).add(target.id)
+
+@event.listens_for(User, "after_delete")
+def _track_user_delete(mapper, connection, target):
+    inspect(target).session.info.setdefault("invalidated_users", set()).add(target.id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_cached_users(session):
+    user_ids = session.info.pop("invalidated_users", None)
+    if user_ids:
+        from utils.user_cache import invalidate_user_sync
+        for user_id in user_ids:
+            invalidate_user_sync(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_cached_user_changes(session):
+    session.info.pop("invalidated_users", None)
+
+# Identidad mínima construida a partir de los claims verificados del token
+class Principal(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    email: str
+    role: str
+
+# Instantánea del usuario autenticado que se guarda en caché
+class UserPrincipal(Principal):
+    is_authorized: bool
+    nombre_completo: str
+    apellidos: str
+    direccion: str
+    edad: int
+    telefono: str
+    created_at: datetime
+
+
+# Tablas de habitaciones y reservas
+# Estados de reserva que no ocupan la habitación
+BOOKING_INACTIVE_STATES = ("Cancelada",)
+
+class RoomDB(Base):
+    __tablename__ = 'rooms'
+
+    Id = Column(Integer, primary_key=True, index=True)
+    Estado = Column(String(20), nullable=False, default="Disponible")
+    Capacidad = Column(Integer, nullable=False)
+    Caracteristicas = Column(JSON, nullable=False, default=list)
+    Ubicacion = Column(String(255), nullable=False)
+
+    bookings = relationship("BookingDB", back_populates="room")
+
+    __table_args__ = (
+        # Búsqueda de disponibilidad: filtra por estado y capacidad mínima
+        Index('ix_rooms_estado_capacidad', 'Estado', 'Capacidad'),
+        CheckConstraint('"Capacidad" >= 1', name='ck_rooms_capacidad'),
+    )
+
+    def __repr__(self):
+        return f"RoomDB(Id={self.Id}, Capacidad={self.Capacidad}, Estado='{self.Estado}')"
+
+class BookingDB(Base):
+    __tablename__ = 'bookings'
+
+    Id = Column(Integer, primary_key=True, index=True)
+    Room_Id = Column(Integer, ForeignKey('rooms.Id'), nullable=False)
+    User_Id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+    Estado = Column(String(20), nullable=False, default="Pendiente")
+    BookingIn = Column(DateTime, nullable=False)
+    BookingOn = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+
+    room = relationship("RoomDB", back_populates="bookings")
+
+    __table_args__ = (
+        # Consulta de solapamiento: igualdad en Room_Id y rango sobre BookingIn,
+        # BookingOn se resuelve desde el propio índice
+        Index('ix_bookings_room_in_on', 'Room_Id', 'BookingIn', 'BookingOn'),
+        CheckConstraint('"BookingOn" > "BookingIn"', name='ck_bookings_rango'),
+    )
+
+    def __repr__(self):
+        return f"BookingDB(Id={self.Id}, Room_Id={self.Room_Id}, {self.BookingIn} -> {self.BookingOn})"
+
+# En PostgreSQL la base de datos impide por sí misma dos reservas activas
+# solapadas de la misma habitación (requiere la extensión btree_gist)
+BOOKING_EXCLUSION_CONSTRAINT = 'ex_bookings_room_periodo'
+
+event.listen(
+    BookingDB.__table__, 'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS btree_gist').execute_if(dialect='postgresql')
+)
+event.listen(
+    BookingDB.__table__, 'after_create',
+    DDL(
+        f'ALTER TABLE bookings ADD CONSTRAINT {BOOKING_EXCLUSION_CONSTRAINT} '
+        'EXCLUDE USING gist ("Room_Id" WITH =, tsrange("BookingIn", "BookingOn") WITH &&) '
+        "WHERE (\"Estado\" <> 'Cancelada')"
+    ).execute_if(dialect='postgresql')
+)
+
+# Tabla de notificaciones (también actúa como outbox de envíos pendientes)
+class NotificationDB(Base):
+    __tablename__ = 'notifications'
+
+    Id = Column(Integer, primary_key=True, index=True)
+    User_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    Mensaje = Column(Text, nullable=False)
+    Estado = Column(Boolean, nullable=False, default=False)  # Entregada o no
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+    # Estado del envío: el worker toma las filas con enviada_en nulo cuyo
+    # proximo_intento ya venció
+    enviada_en = Column(DateTime, nullable=True)
+    proximo_intento = Column(DateTime, default=datetime.now, nullable=False)
+    intentos = Column(Integer, nullable=False, default=0)
+    ultimo_error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        # Bandeja paginada por cursor: igualdad en User_id y orden por
+        # (created_at, Id); en PostgreSQL el índice incluye Estado para filtrar
+        # leídas/no leídas sin visitar la tabla
+        Index(
+            'ix_notifications_inbox', 'User_id', 'created_at', 'Id',
+            postgresql_include=['Estado'],
+        ),
+        Index(
+            'ix_notifications_pendientes', 'proximo_intento',
+            postgresql_where=enviada_en.is_(None),
+            sqlite_where=enviada_en.is_(None),
+        ),
+    )
+
+    def __repr__(self):
+        return f"NotificationDB(Id={self.Id}, User_id={self.User_id}, Estado={self.Estado})"
+
+# Refresh tokens revocados (persistencia opcional de utils.token_store). La
+# clave es 'jti:<id>' para un token consumido o 'fam:<id>' para una sesión
+# cerrada; la unicidad hace atómica la rotación entre workers
+class RevokedTokenDB(Base):
+    __tablename__ = 'revoked_tokens'
+
+    Id = Column(Integer, primary_key=True)
+    clave = Column(String(80), nullable=False, unique=True)
+    expira_en = Column(DateTime, nullable=False, index=True)
+    # Hora de la base de datos (no la del worker) para sincronizar por ventana
+    creado_en = Column(DateTime, nullable=False, server_default=func.now(), index=True)
+
+    def __repr__(self):
+        return f"RevokedTokenDB(clave='{self.clave}', expira_en={self.expira_en})"
+
+# Contador de notificaciones no entregadas por usuario, para no hacer COUNT(*)
+# sobre la bandeja en cada consulta
+class NotificationCounterDB(Base):
+    __tablename__ = 'notification_counters'
+
+    User_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    no_leidas = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"NotificationCounterDB(User_id={self.User_id}, no_leidas={self.no_leidas})"
+
+def adjust_unread_counters(connection, deltas):
+    """Suma {User_id: delta} a los contadores con un único upsert"""
+    params = [{"User_id": user_id, "no_leidas": delta} for user_id, delta in deltas.items() if delta]
+    if not params:
+        return
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    table = NotificationCounterDB.__table__
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.User_id],
+        set_={"no_leidas": table.c.no_leidas + stmt.excluded.no_leidas},
+    )
+    connection.execute(stmt, params)
+
+# Los cambios hechos con el ORM (alta de notificaciones, PATCH de una
+# notificación) actualizan el contador en el mismo flush. Las actualizaciones
+# masivas por UPDATE llaman a adjust_unread_counters directamente.
+@event.listens_for(Session, "after_flush")
+def _track_unread_notifications(session, flush_context):
+    deltas = {}
+    for obj in session.new:
+        if isinstance(obj, NotificationDB) and not obj.Estado:
+            deltas[obj.User_id] = deltas.get(obj.User_id, 0) + 1
+    for obj in session.dirty:
+        if isinstance(obj, NotificationDB):
+            history = inspect(obj).attrs.Estado.history
+            if history.deleted and bool(history.deleted[0]) != bool(obj.Estado):
+                deltas[obj.User_id] = deltas.get(obj.User_id, 0) + (-1 if obj.Estado else 1)
+    for obj in session.deleted:
+        if isinstance(obj, NotificationDB) and not obj.Estado:
+            deltas[obj.User_id] = deltas.get(obj.User_id, 0) - 1
+    if deltas:
+        adjust_unread_counters(session.connection(), deltas)
 
 #Booking
 class Booking(BaseModel):
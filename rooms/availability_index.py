@@ -0,0 +1,222 @@
+"""
+Índice en memoria de ocupación por habitación.
+
+Para cada habitación se mantienen las reservas activas como arreglos
+ordenados por fecha de entrada, de modo que "¿está libre la habitación X en
+[desde, hasta)?" se responde con una búsqueda binaria (``bisect``) sin tocar la
+base de datos.
+
+El índice se carga al arrancar y se actualiza de forma incremental cuando
+este proceso crea o cancela reservas. Como otros workers pueden escribir en la
+misma base de datos, el índice caduca tras ``AVAILABILITY_INDEX_MAX_AGE_SECONDS``;
+mientras está caducado (o si la consulta cae antes del horizonte cargado) la
+respuesta se obtiene de la base de datos y se programa una recarga en segundo
+plano. La base de datos sigue siendo la fuente de verdad al crear reservas.
+"""
+import asyncio
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+
+from models import BookingDB, RoomDB, BOOKING_INACTIVE_STATES
+from utils.config import settings
+
+
+class RoomIntervals:
+    """Reservas de una habitación ordenadas por fecha de entrada"""
+
+    __slots__ = ("starts", "ends", "ids", "max_ends")
+
+    def __init__(self):
+        self.starts: List[datetime] = []
+        self.ends: List[datetime] = []
+        self.ids: List[int] = []
+        # max_ends[i] = salida más tardía entre las reservas 0..i. Con ella el
+        # solapamiento se resuelve con una búsqueda binaria aunque haya
+        # reservas que se solapen entre sí
+        self.max_ends: List[datetime] = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _refresh_max_ends(self, i: int):
+        """Recalcula el máximo acumulado desde ``i`` hasta que deja de cambiar"""
+        running = self.max_ends[i - 1] if i > 0 else None
+        for j in range(i, len(self.ends)):
+            value = self.ends[j] if running is None or self.ends[j] > running else running
+            if self.max_ends[j] == value:
+                return
+            self.max_ends[j] = value
+            running = value
+
+    def add(self, booking_id: int, start: datetime, end: datetime):
+        i = bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.ids.insert(i, booking_id)
+        self.max_ends.insert(i, end if i == 0 or end > self.max_ends[i - 1] else self.max_ends[i - 1])
+        self._refresh_max_ends(i + 1)
+
+    def remove(self, booking_id: int, start: datetime) -> bool:
+        i = bisect_left(self.starts, start)
+        while i < len(self.starts) and self.starts[i] == start:
+            if self.ids[i] == booking_id:
+                del self.starts[i], self.ends[i], self.ids[i], self.max_ends[i]
+                self._refresh_max_ends(i)
+                return True
+            i += 1
+        return False
+
+    def overlaps(self, start: datetime, end: datetime) -> bool:
+        # Candidatas: reservas que entran antes de ``end``; alguna se solapa
+        # si la salida más tardía entre ellas es posterior a ``start``
+        i = bisect_left(self.starts, end)
+        return i > 0 and self.max_ends[i - 1] > start
+
+
+class AvailabilityIndex:
+    """Índice de disponibilidad de todas las habitaciones del proceso"""
+
+    def __init__(self, max_age: float):
+        self.max_age = max_age
+        self._rooms: Dict[int, RoomIntervals] = {}
+        self._bookings: Dict[int, Tuple[int, datetime]] = {}
+        # Habitaciones existentes (no se borran nunca, así que el conjunto solo crece)
+        self._room_ids: Set[int] = set()
+        self._loaded_at: Optional[float] = None
+        self._horizon: Optional[datetime] = None
+        self._reloading = False
+        self._journal: List[tuple] = []
+        self.hits = 0
+        self.fallbacks = 0
+
+    @property
+    def is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.max_age
+
+    def invalidate(self):
+        """Fuerza la consulta a la base de datos hasta la próxima recarga"""
+        self._loaded_at = None
+
+    async def reload(self, db):
+        """Carga las reservas activas que terminan después de ahora"""
+        self._reloading = True
+        try:
+            room_ids = set((await db.scalars(select(RoomDB.Id))).all())
+            horizon = datetime.now()
+            result = await db.stream(
+                select(BookingDB.Id, BookingDB.Room_Id, BookingDB.BookingIn, BookingDB.BookingOn)
+                .where(
+                    BookingDB.BookingOn > horizon,
+                    BookingDB.Estado.notin_(BOOKING_INACTIVE_STATES),
+                )
+                .order_by(BookingDB.Room_Id, BookingDB.BookingIn)
+                .execution_options(yield_per=5000)
+            )
+            rooms: Dict[int, RoomIntervals] = {}
+            bookings: Dict[int, Tuple[int, datetime]] = {}
+            async for booking_id, room_id, start, end in result:
+                intervals = rooms.get(room_id)
+                if intervals is None:
+                    intervals = rooms[room_id] = RoomIntervals()
+                intervals.add(booking_id, start, end)
+                bookings[booking_id] = (room_id, start)
+
+            self._rooms, self._bookings = rooms, bookings
+            self._room_ids |= room_ids
+            # Aplicar los cambios de este proceso ocurridos durante la carga
+            for event in self._journal:
+                self._apply(*event)
+            self._horizon = horizon
+            self._loaded_at = time.monotonic()
+        finally:
+            self._reloading = False
+            self._journal = []
+
+    def _apply(self, action: str, booking_id: int, room_id: int, start: datetime, end: Optional[datetime]):
+        if action == "add":
+            if booking_id in self._bookings:
+                return
+            intervals = self._rooms.get(room_id)
+            if intervals is None:
+                intervals = self._rooms[room_id] = RoomIntervals()
+            intervals.add(booking_id, start, end)
+            self._bookings[booking_id] = (room_id, start)
+        else:
+            entry = self._bookings.pop(booking_id, None)
+            if entry is not None:
+                self._rooms[entry[0]].remove(booking_id, entry[1])
+
+    def has_room(self, room_id: int) -> bool:
+        """True si se sabe que la habitación existe (False: hay que preguntar a la BD)"""
+        return room_id in self._room_ids
+
+    def room_added(self, room_id: int):
+        self._room_ids.add(room_id)
+
+    def booking_added(self, booking_id: int, room_id: int, start: datetime, end: datetime):
+        event = ("add", booking_id, room_id, start, end)
+        if self._reloading:
+            self._journal.append(event)
+        self._apply(*event)
+
+    def booking_removed(self, booking_id: int, room_id: int, start: datetime):
+        event = ("remove", booking_id, room_id, start, None)
+        if self._reloading:
+            self._journal.append(event)
+        self._apply(*event)
+
+    def is_available(self, room_id: int, start: datetime, end: datetime) -> Optional[bool]:
+        """
+        Respuesta desde memoria o ``None`` si el índice no puede responder
+        (no cargado, caducado o consulta anterior al horizonte cargado).
+        """
+        if not self.is_fresh or start < self._horizon:
+            self.fallbacks += 1
+            return None
+        self.hits += 1
+        intervals = self._rooms.get(room_id)
+        return intervals is None or not intervals.overlaps(start, end)
+
+    async def check_available(self, db, room_id: int, start: datetime, end: datetime) -> bool:
+        """Consulta el índice y recurre a la base de datos si no puede responder"""
+        available = self.is_available(room_id, start, end)
+        if available is not None:
+            return available
+        if not self.is_fresh:
+            self.schedule_reload()
+        from rooms.rooms import is_room_available
+        return await is_room_available(db, room_id, start, end)
+
+    def schedule_reload(self):
+        """Recarga el índice en segundo plano con su propia sesión"""
+        if self._reloading or not settings.AVAILABILITY_INDEX_ENABLED:
+            return
+        self._reloading = True
+        asyncio.get_running_loop().create_task(self._reload_with_session())
+
+    async def _reload_with_session(self):
+        from database import AsyncSessionLocal
+        try:
+            async with AsyncSessionLocal() as db:
+                await self.reload(db)
+        except Exception as e:
+            self._reloading = False
+            print(f"Error recargando el índice de disponibilidad: {e}")
+
+    def stats(self) -> Dict[str, object]:
+        total = self.hits + self.fallbacks
+        return {
+            "rooms": len(self._rooms),
+            "bookings": len(self._bookings),
+            "fresh": self.is_fresh,
+            "hits": self.hits,
+            "fallbacks": self.fallbacks,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+availability_index = AvailabilityIndex(max_age=settings.AVAILABILITY_INDEX_MAX_AGE_SECONDS)
@@ -0,0 +1,202 @@
+"""
+Creación de reservas segura ante concurrencia.
+
+Un "comprobar y luego insertar" dentro de un handler asíncrono permite que dos
+peticiones vean la habitación libre y ambas inserten. Aquí la comprobación y
+la inserción ocurren en la misma transacción después de bloquear la
+habitación:
+
+* PostgreSQL: ``SELECT ... FOR UPDATE`` sobre la fila de la habitación y, como
+  red de seguridad, una restricción de exclusión sobre
+  ``tsrange(BookingIn, BookingOn)`` (ver ``models.BookingDB``).
+* SQLite: la transacción empieza con una escritura sobre la fila de la
+  habitación, lo que toma el bloqueo de escritura de la base de datos y
+  serializa las transacciones de reserva entre procesos.
+
+Dentro de un mismo proceso, además, las reservas de una habitación se
+serializan con un ``asyncio.Lock`` para no competir por el bloqueo de la base.
+"""
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select, update, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import RoomDB, BookingDB, BOOKING_EXCLUSION_CONSTRAINT
+from utils.notification_outbox import enqueue_notification, notification_outbox
+
+
+def _booking_message(room_id: int, desde: datetime, hasta: datetime) -> str:
+    return f"Reserva registrada: habitación {room_id} del {desde:%Y-%m-%d %H:%M} al {hasta:%Y-%m-%d %H:%M}."
+
+
+class BookingConflictError(Exception):
+    """La habitación ya está reservada en el periodo solicitado"""
+
+
+class RoomNotAvailableError(Exception):
+    """La habitación no existe o no admite reservas"""
+
+
+# Un lock por habitación; desaparece cuando ninguna corrutina lo usa
+_room_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _room_lock(room_id: int) -> asyncio.Lock:
+    lock = _room_locks.get(room_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _room_locks[room_id] = lock
+    return lock
+
+
+@asynccontextmanager
+async def room_locks(room_ids: Iterable[int]):
+    """Toma los locks de proceso de varias habitaciones en orden (sin interbloqueos)"""
+    locks = [_room_lock(room_id) for room_id in sorted(set(room_ids))]
+    acquired = []
+    try:
+        for lock in locks:
+            await lock.acquire()
+            acquired.append(lock)
+        yield
+    finally:
+        for lock in reversed(acquired):
+            lock.release()
+
+
+async def lock_rooms(db: AsyncSession, room_ids: Iterable[int]) -> Dict[int, str]:
+    """
+    Bloquea las filas de las habitaciones dentro de la transacción actual.
+    Debe ser la primera sentencia de la transacción. Devuelve {Id: Estado}
+    de las habitaciones que existen.
+    """
+    ids = sorted(set(room_ids))
+    query = select(RoomDB.Id, RoomDB.Estado).where(RoomDB.Id.in_(ids)).order_by(RoomDB.Id)
+    if db.get_bind().dialect.name == 'postgresql':
+        result = await db.execute(query.with_for_update())
+        return dict(result.all())
+
+    # SQLite no tiene bloqueo por fila: una escritura inocua toma el bloqueo de
+    # escritura de la base de datos hasta el commit
+    await db.execute(
+        update(RoomDB).where(RoomDB.Id.in_(ids)).values(Id=RoomDB.Id)
+        .execution_options(synchronize_session=False)
+    )
+    result = await db.execute(query)
+    return dict(result.all())
+
+
+async def create_booking_safe(
+    db: AsyncSession, user_id: int, room_id: int, desde: datetime, hasta: datetime
+) -> BookingDB:
+    """Crea una reserva garantizando que no se solape con otra activa"""
+    from rooms.rooms import is_room_available
+
+    async with room_locks([room_id]):
+        try:
+            estados = await lock_rooms(db, [room_id])
+            if estados.get(room_id) != "Disponible":
+                raise RoomNotAvailableError(room_id)
+
+            if not await is_room_available(db, room_id, desde, hasta):
+                raise BookingConflictError(room_id)
+
+            booking = BookingDB(Room_Id=room_id, User_Id=user_id, BookingIn=desde, BookingOn=hasta)
+            db.add(booking)
+            # La notificación se confirma en la misma transacción que la reserva
+            enqueue_notification(db, user_id, _booking_message(room_id, desde, hasta))
+            await db.commit()
+        except IntegrityError as e:
+            await db.rollback()
+            # Restricción de exclusión de PostgreSQL
+            if BOOKING_EXCLUSION_CONSTRAINT in str(e.orig):
+                raise BookingConflictError(room_id)
+            raise
+        except Exception:
+            await db.rollback()
+            raise
+
+    notification_outbox.wake()
+    return booking
+
+
+async def create_bookings_bulk(
+    db: AsyncSession,
+    user_id: int,
+    items: Sequence[Tuple[int, datetime, datetime]],
+    all_or_nothing: bool = False,
+) -> List[Tuple[str, Optional[BookingDB]]]:
+    """
+    Crea varias reservas (Room_Id, desde, hasta) en una sola transacción.
+
+    Las habitaciones se bloquean una vez, los conflictos con reservas
+    existentes se resuelven con una única consulta y las filas aceptadas se
+    insertan con un solo INSERT. Dentro del lote gana el primer elemento de
+    cada par solapado. Devuelve (estado, reserva) por elemento.
+    """
+    from rooms.rooms import conflicting_requests
+    from rooms.availability_index import RoomIntervals
+
+    room_ids = {room_id for room_id, _, _ in items}
+    outcomes: List[Tuple[str, Optional[BookingDB]]] = []
+
+    async with room_locks(room_ids):
+        try:
+            estados = await lock_rooms(db, room_ids)
+            conflicts = await conflicting_requests(db, [
+                (i, room_id, desde, hasta)
+                for i, (room_id, desde, hasta) in enumerate(items)
+                if estados.get(room_id) == "Disponible"
+            ])
+
+            accepted: List[int] = []
+            in_batch: Dict[int, RoomIntervals] = {}
+            for i, (room_id, desde, hasta) in enumerate(items):
+                if estados.get(room_id) != "Disponible":
+                    outcomes.append(("no_disponible", None))
+                elif i in conflicts or (room_id in in_batch and in_batch[room_id].overlaps(desde, hasta)):
+                    outcomes.append(("conflicto", None))
+                else:
+                    in_batch.setdefault(room_id, RoomIntervals()).add(i, desde, hasta)
+                    accepted.append(i)
+                    outcomes.append(("creada", None))
+
+            if all_or_nothing and len(accepted) != len(items):
+                await db.rollback()
+                return [("revertida", None) if estado == "creada" else (estado, None) for estado, _ in outcomes]
+
+            if accepted:
+                now = datetime.now()
+                bookings = await db.scalars(
+                    insert(BookingDB).returning(BookingDB, sort_by_parameter_order=True),
+                    [
+                        {
+                            "Room_Id": items[i][0], "User_Id": user_id, "Estado": "Pendiente",
+                            "BookingIn": items[i][1], "BookingOn": items[i][2], "created_at": now,
+                        }
+                        for i in accepted
+                    ],
+                )
+                for i, booking in zip(accepted, bookings.all()):
+                    outcomes[i] = ("creada", booking)
+                for i in accepted:
+                    enqueue_notification(db, user_id, _booking_message(*items[i]))
+            await db.commit()
+        except IntegrityError as e:
+            await db.rollback()
+            if BOOKING_EXCLUSION_CONSTRAINT in str(e.orig):
+                # Otro escritor ganó la carrera pese al bloqueo (no debería ocurrir)
+                return [("conflicto", None) if estado == "creada" else (estado, None) for estado, _ in outcomes]
+            raise
+        except Exception:
+            await db.rollback()
+            raise
+
+    if accepted:
+        notification_outbox.wake()
+    return outcomes
@@ -0,0 +1,331 @@
+from datetime import datetime
+from typing import Dict, List, Sequence, Set, Tuple
+
+from fastapi import APIRouter, HTTPException, Query, status, Depends
+from sqlalchemy import select, exists, and_, union_all, literal, func, Integer, DateTime
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_async_db
+from models import RoomDB, BookingDB, Principal, BOOKING_INACTIVE_STATES
+from rooms.squemas import (
+    RoomCreate, RoomOut, BookingCreate, BookingOut, RoomAvailabilityOut, _to_naive,
+    BulkBookingRequest, BulkBookingItemResult, BulkAvailabilityRequest, AvailabilityItemResult
+)
+from rooms.availability_index import availability_index
+from rooms.reservations import (
+    create_booking_safe, create_bookings_bulk, BookingConflictError, RoomNotAvailableError
+)
+from utils.auth import get_principal, get_admin_user
+
+router = APIRouter(prefix="/rooms", tags=["Habitaciones"])
+bookings_router = APIRouter(prefix="/bookings", tags=["Reservas"])
+
+# Consultas de disponibilidad
+def overlapping_bookings(room_id, desde: datetime, hasta: datetime):
+    """
+    Condición de solapamiento con reservas activas de una habitación.
+    Dos intervalos [a, b) y [c, d) se solapan si a < d y c < b; con el índice
+    (Room_Id, BookingIn, BookingOn) se resuelve como un rango sobre el índice.
+    """
+    return and_(
+        BookingDB.Room_Id == room_id,
+        BookingDB.BookingIn < hasta,
+        BookingDB.BookingOn > desde,
+        BookingDB.Estado.notin_(BOOKING_INACTIVE_STATES),
+    )
+
+def available_rooms_query(capacidad: int, desde: datetime, hasta: datetime, limit: int = 100):
+    """Habitaciones disponibles con capacidad >= N sin reservas en [desde, hasta)"""
+    return (
+        select(RoomDB)
+        .where(
+            RoomDB.Estado == "Disponible",
+            RoomDB.Capacidad >= capacidad,
+            ~exists().where(overlapping_bookings(RoomDB.Id, desde, hasta)),
+        )
+        .order_by(RoomDB.Capacidad, RoomDB.Id)
+        .limit(limit)
+    )
+
+async def is_room_available(db: AsyncSession, room_id: int, desde: datetime, hasta: datetime) -> bool:
+    """Comprueba en la base de datos si una habitación está libre en [desde, hasta)"""
+    conflict = await db.scalar(
+        select(exists().where(overlapping_bookings(room_id, desde, hasta)))
+    )
+    return not conflict
+
+# Consultas por lotes: cada lote se envía como una tabla derivada y se resuelve
+# con una sola sentencia en lugar de una consulta por elemento
+def _rows_table(name: str, columns: Sequence[Tuple[str, object]], rows: Sequence[tuple]):
+    """
+    Tabla derivada con las filas del lote. Se construye con UNION ALL porque
+    SQLite no admite ``VALUES ... AS t (columnas)``.
+    """
+    return union_all(*[
+        select(*[literal(value, type_).label(col) for (col, type_), value in zip(columns, row)])
+        for row in rows
+    ]).subquery(name)
+
+async def conflicting_requests(
+    db: AsyncSession, requests: Sequence[Tuple[int, int, datetime, datetime]]
+) -> Set[int]:
+    """Índices de las solicitudes (indice, Room_Id, desde, hasta) que chocan con reservas activas"""
+    if not requests:
+        return set()
+    solicitudes = _rows_table(
+        'solicitudes',
+        [('idx', Integer), ('room_id', Integer), ('desde', DateTime), ('hasta', DateTime)],
+        requests,
+    )
+    result = await db.scalars(
+        select(solicitudes.c.idx).where(
+            exists().where(overlapping_bookings(solicitudes.c.room_id, solicitudes.c.desde, solicitudes.c.hasta))
+        )
+    )
+    return set(result)
+
+async def room_request_states(
+    db: AsyncSession, requests: Sequence[Tuple[int, int, datetime, datetime]]
+) -> Dict[int, str]:
+    """
+    Estado de cada solicitud (indice, Room_Id, desde, hasta) en una sola consulta:
+    'disponible', 'conflicto', 'no_disponible' (la habitación no admite
+    reservas) o 'no_encontrada'.
+    """
+    if not requests:
+        return {}
+    solicitudes = _rows_table(
+        'solicitudes',
+        [('idx', Integer), ('room_id', Integer), ('desde', DateTime), ('hasta', DateTime)],
+        requests,
+    )
+    result = await db.execute(
+        select(
+            solicitudes.c.idx,
+            RoomDB.Estado,
+            exists().where(
+                overlapping_bookings(solicitudes.c.room_id, solicitudes.c.desde, solicitudes.c.hasta)
+            ).label('conflicto'),
+        )
+        .select_from(solicitudes)
+        .outerjoin(RoomDB, RoomDB.Id == solicitudes.c.room_id)
+    )
+    states = {}
+    for idx, estado, conflict in result:
+        if estado is None:
+            states[idx] = "no_encontrada"
+        elif estado != "Disponible":
+            states[idx] = "no_disponible"
+        else:
+            states[idx] = "conflicto" if conflict else "disponible"
+    return states
+
+async def bulk_available_rooms(
+    db: AsyncSession, searches: Sequence[Tuple[int, int, datetime, datetime, int]]
+) -> Dict[int, List[RoomDB]]:
+    """Habitaciones libres para varias búsquedas (indice, capacidad, desde, hasta, limite)"""
+    if not searches:
+        return {}
+    busquedas = _rows_table(
+        'busquedas',
+        [('idx', Integer), ('capacidad', Integer), ('desde', DateTime), ('hasta', DateTime), ('limite', Integer)],
+        searches,
+    )
+    ranked = (
+        select(
+            busquedas.c.idx,
+            busquedas.c.limite,
+            RoomDB.Id.label('room_id'),
+            func.row_number().over(
+                partition_by=busquedas.c.idx, order_by=(RoomDB.Capacidad, RoomDB.Id)
+            ).label('rn'),
+        )
+        .select_from(busquedas)
+        .join(RoomDB, and_(RoomDB.Estado == "Disponible", RoomDB.Capacidad >= busquedas.c.capacidad))
+        .where(~exists().where(overlapping_bookings(RoomDB.Id, busquedas.c.desde, busquedas.c.hasta)))
+        .subquery()
+    )
+    result = await db.execute(
+        select(ranked.c.idx, RoomDB)
+        .join(RoomDB, RoomDB.Id == ranked.c.room_id)
+        .where(ranked.c.rn <= ranked.c.limite)
+        .order_by(ranked.c.idx, ranked.c.rn)
+    )
+    rooms: Dict[int, List[RoomDB]] = {idx: [] for idx, *_ in searches}
+    for idx, room in result:
+        rooms[idx].append(room)
+    return rooms
+
+def _booking_conflict() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="La habitación ya está reservada en ese periodo."
+    )
+
+def _validate_range(desde: datetime, hasta: datetime):
+    desde, hasta = _to_naive(desde), _to_naive(hasta)
+    if hasta <= desde:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="La fecha de salida debe ser posterior a la de entrada."
+        )
+    return desde, hasta
+
+@router.post("", response_model=RoomOut, status_code=status.HTTP_201_CREATED)
+async def create_room(
+    room: RoomCreate,
+    current_user: Principal = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Crear una habitación (solo administradores)"""
+    db_room = RoomDB(**room.model_dump())
+    db.add(db_room)
+    await db.commit()
+    await db.refresh(db_room)
+    availability_index.room_added(db_room.Id)
+    return db_room
+
+@router.get("/disponibles", response_model=List[RoomOut])
+async def search_available_rooms(
+    desde: datetime = Query(..., description="Fecha y hora de entrada"),
+    hasta: datetime = Query(..., description="Fecha y hora de salida"),
+    capacidad: int = Query(1, ge=1, description="Capacidad mínima"),
+    limit: int = Query(100, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Buscar habitaciones libres con capacidad >= N entre dos fechas"""
+    desde, hasta = _validate_range(desde, hasta)
+    result = await db.scalars(available_rooms_query(capacidad, desde, hasta, limit))
+    return result.all()
+
+@router.post("/disponibles/bulk", response_model=List[AvailabilityItemResult])
+async def bulk_availability(
+    request: BulkAvailabilityRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Resolver varias consultas de disponibilidad en una sola petición.
+    Las consultas con Room_Id devuelven ``disponible`` y ``estado`` (el motivo
+    cuando no lo está: conflicto, no_disponible o no_encontrada); las demás
+    devuelven las habitaciones libres con la capacidad pedida.
+    """
+    checks = [(i, q.Room_Id, q.desde, q.hasta) for i, q in enumerate(request.consultas) if q.Room_Id is not None]
+    searches = [
+        (i, q.capacidad, q.desde, q.hasta, q.limite)
+        for i, q in enumerate(request.consultas) if q.Room_Id is None
+    ]
+    states = await room_request_states(db, checks)
+    found = await bulk_available_rooms(db, searches)
+
+    results = []
+    for i, q in enumerate(request.consultas):
+        if q.Room_Id is not None:
+            results.append({"indice": i, "disponible": states[i] == "disponible", "estado": states[i]})
+        else:
+            results.append({"indice": i, "habitaciones": found.get(i, [])})
+    return results
+
+@router.get("/{room_id}", response_model=RoomOut)
+async def get_room(room_id: int, db: AsyncSession = Depends(get_async_db)):
+    room = await db.get(RoomDB, room_id)
+    if room is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Habitación no encontrada."
+        )
+    return room
+
+@router.get("/{room_id}/disponible", response_model=RoomAvailabilityOut)
+async def check_room_availability(
+    room_id: int,
+    desde: datetime = Query(..., description="Fecha y hora de entrada"),
+    hasta: datetime = Query(..., description="Fecha y hora de salida"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Comprobar si una habitación está libre (índice en memoria con respaldo en BD)"""
+    desde, hasta = _validate_range(desde, hasta)
+    # Las habitaciones conocidas por el índice no necesitan consulta; el resto
+    # (p. ej. creadas por otro worker) se comprueba una vez en la BD
+    if not availability_index.has_room(room_id):
+        if await db.get(RoomDB, room_id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Habitación no encontrada."
+            )
+        availability_index.room_added(room_id)
+    available = await availability_index.check_available(db, room_id, desde, hasta)
+    return {"Room_Id": room_id, "desde": desde, "hasta": hasta, "disponible": available}
+
+@bookings_router.post("", response_model=BookingOut, status_code=status.HTTP_201_CREATED)
+async def create_booking(
+    booking: BookingCreate,
+    current_user: Principal = Depends(get_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Reservar una habitación para el usuario actual"""
+    # No se consulta el índice en memoria: solo conoce las cancelaciones de
+    # este worker y rechazaría reservas válidas. Decide create_booking_safe
+    # contra la base de datos, bajo bloqueo
+    try:
+        db_booking = await create_booking_safe(
+            db, current_user.id, booking.Room_Id, booking.BookingIn, booking.BookingOn
+        )
+    except RoomNotAvailableError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Habitación no encontrada o no disponible."
+        )
+    except BookingConflictError:
+        raise _booking_conflict()
+
+    availability_index.booking_added(
+        db_booking.Id, db_booking.Room_Id, db_booking.BookingIn, db_booking.BookingOn
+    )
+    return db_booking
+
+@bookings_router.post("/bulk", response_model=List[BulkBookingItemResult])
+async def create_bookings_in_bulk(
+    request: BulkBookingRequest,
+    current_user: Principal = Depends(get_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Reservar varias habitaciones en una sola transacción.
+    Devuelve el resultado de cada elemento; con ``todo_o_nada`` basta un fallo
+    para revertir el lote completo.
+    """
+    outcomes = await create_bookings_bulk(
+        db,
+        current_user.id,
+        [(b.Room_Id, b.BookingIn, b.BookingOn) for b in request.reservas],
+        all_or_nothing=request.todo_o_nada,
+    )
+    results = []
+    for i, (estado, db_booking) in enumerate(outcomes):
+        if db_booking is not None:
+            availability_index.booking_added(
+                db_booking.Id, db_booking.Room_Id, db_booking.BookingIn, db_booking.BookingOn
+            )
+        results.append({"indice": i, "estado": estado, "reserva": db_booking})
+    return results
+
+@bookings_router.post("/{booking_id}/cancelar", response_model=BookingOut)
+async def cancel_booking(
+    booking_id: int,
+    current_user: Principal = Depends(get_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Cancelar una reserva propia (o cualquiera si es administrador)"""
+    booking = await db.get(BookingDB, booking_id)
+    if booking is None or (booking.User_Id != current_user.id and current_user.role != 'admin'):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Reserva no encontrada."
+        )
+
+    if booking.Estado != "Cancelada":
+        booking.Estado = "Cancelada"
+        await db.commit()
+        await db.refresh(booking)
+        availability_index.booking_removed(booking.Id, booking.Room_Id, booking.BookingIn)
+    return booking
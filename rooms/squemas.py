@@ -0,0 +1,107 @@
+# Esquemas de Pydantic para habitaciones y reservas
+from datetime import datetime
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
+
+
+def _to_naive(value: datetime) -> datetime:
+    """Las fechas se guardan sin zona horaria (hora local del servidor)"""
+    if value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
+
+
+class RoomCreate(BaseModel):
+    Capacidad: int = Field(..., ge=1, description="Capacidad de la habitación")
+    Caracteristicas: List[str] = Field(default_factory=list, description="Características de la habitación")
+    Ubicacion: str = Field(..., min_length=1, description="Ubicación de la habitación")
+    Estado: str = Field(default="Disponible", description="Estado de la habitación")
+
+
+class RoomOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    Id: int
+    Estado: str
+    Capacidad: int
+    Caracteristicas: List[str]
+    Ubicacion: str
+
+
+class BookingCreate(BaseModel):
+    Room_Id: int = Field(..., description="Habitación a reservar")
+    BookingIn: datetime = Field(..., description="Fecha y hora de entrada")
+    BookingOn: datetime = Field(..., description="Fecha y hora de salida")
+
+    @field_validator('BookingIn', 'BookingOn')
+    @classmethod
+    def _naive_datetime(cls, value: datetime) -> datetime:
+        return _to_naive(value)
+
+    @model_validator(mode='after')
+    def _check_range(self):
+        if self.BookingOn <= self.BookingIn:
+            raise ValueError("La salida debe ser posterior a la entrada")
+        return self
+
+
+class BookingOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    Id: int
+    Room_Id: int
+    User_Id: int
+    Estado: str
+    BookingIn: datetime
+    BookingOn: datetime
+    created_at: Optional[datetime] = None
+
+
+class RoomAvailabilityOut(BaseModel):
+    Room_Id: int
+    desde: datetime
+    hasta: datetime
+    disponible: bool
+
+
+# Operaciones por lotes
+class BulkBookingRequest(BaseModel):
+    reservas: List[BookingCreate] = Field(..., min_length=1, max_length=200)
+    todo_o_nada: bool = Field(default=False, description="Revertir todo el lote si alguna reserva falla")
+
+
+class BulkBookingItemResult(BaseModel):
+    indice: int
+    estado: Literal["creada", "conflicto", "no_disponible", "revertida"]
+    reserva: Optional[BookingOut] = None
+
+
+class AvailabilityQuery(BaseModel):
+    Room_Id: Optional[int] = Field(None, description="Habitación concreta; si se omite se buscan habitaciones libres")
+    capacidad: int = Field(default=1, ge=1, description="Capacidad mínima para la búsqueda")
+    desde: datetime
+    hasta: datetime
+    limite: int = Field(default=20, ge=1, le=100)
+
+    @field_validator('desde', 'hasta')
+    @classmethod
+    def _naive_datetime(cls, value: datetime) -> datetime:
+        return _to_naive(value)
+
+    @model_validator(mode='after')
+    def _check_range(self):
+        if self.hasta <= self.desde:
+            raise ValueError("La salida debe ser posterior a la entrada")
+        return self
+
+
+class BulkAvailabilityRequest(BaseModel):
+    consultas: List[AvailabilityQuery] = Field(..., min_length=1, max_length=200)
+
+
+class AvailabilityItemResult(BaseModel):
+    indice: int
+    disponible: Optional[bool] = None
+    estado: Optional[str] = None
+    habitaciones: Optional[List[RoomOut]] = None
@@ -1,8 +1,20 @@
-from fastapi import APIRouter, HTTPException, Query, BackgroundTasks
+import asyncio
+import base64
+
+from fastapi import APIRouter, HTTPException, Query, Depends, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
 from typing import List, Optional, Dict
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
-from models import Notification  
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_async_db
+from models import User, Notification, NotificationDB, NotificationCounterDB, Principal
+from utils.auth import get_principal, get_admin_user, verify_access_token
+from utils.config import settings
+from utils.notification_outbox import enqueue_notification, notification_outbox, set_notifications_state
+from utils.notification_hub import notification_hub
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
 
@@ -15,5 +27,247 @@ class NotificationUpdate(BaseModel):
     estado: Optional[bool] = Field(None, description="Entregada (True) o pendiente (False)")
 
 class NotificationOut(Notification):
+    model_config = ConfigDict(from_attributes=True)
+
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+class NotificationPage(BaseModel):
+    items: List[NotificationOut]
+    next_cursor: Optional[str] = Field(None, description="Cursor de la página siguiente (nulo si no hay más)")
+
+class NotificationBulkUpdate(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=1000, description="IDs de las notificaciones")
+    estado: bool = Field(True, description="Entregada (True) o pendiente (False)")
+
+class UnreadCountOut(BaseModel):
+    no_leidas: int
+
+class NotificationBulkUpdateOut(BaseModel):
+    actualizadas: int = Field(..., description="Notificaciones que cambiaron de estado")
+    no_leidas: Dict[int, int] = Field(..., description="Contador de no leídas actualizado por usuario afectado")
+
+def _encode_cursor(notification: NotificationDB) -> str:
+    raw = f"{notification.created_at.isoformat()}|{notification.Id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        created_at, notification_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(notification_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor inválido."
+        )
+
+def _inbox_owner(principal: Principal, user_id: Optional[int]) -> int:
+    """Cada usuario consulta su bandeja; un administrador puede indicar otra"""
+    if user_id is None or user_id == principal.id:
+        return principal.id
+    if principal.role != 'admin':
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Solo los administradores pueden consultar otras bandejas."
+        )
+    return user_id
+
+async def _unread_count(db: AsyncSession, user_id: int) -> int:
+    no_leidas = await db.scalar(
+        select(NotificationCounterDB.no_leidas).where(NotificationCounterDB.User_id == user_id)
+    )
+    return max(no_leidas or 0, 0)
+
+async def _unread_counts(db: AsyncSession, user_ids) -> Dict[int, int]:
+    rows = await db.execute(
+        select(NotificationCounterDB.User_id, NotificationCounterDB.no_leidas)
+        .where(NotificationCounterDB.User_id.in_(user_ids))
+    )
+    counts = {user_id: 0 for user_id in user_ids}
+    counts.update({user_id: max(no_leidas, 0) for user_id, no_leidas in rows})
+    return counts
+
+async def _get_owned_notification(db: AsyncSession, notification_id: int, principal: Principal) -> NotificationDB:
+    notification = await db.get(NotificationDB, notification_id)
+    if notification is None or (notification.User_id != principal.id and principal.role != 'admin'):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Notificación no encontrada."
+        )
+    return notification
+
+@router.post("", response_model=NotificationOut, status_code=status.HTTP_201_CREATED)
+async def create_notification(
+    notification: NotificationCreate,
+    current_user: Principal = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Encolar una notificación para un usuario (solo administradores).
+    El envío lo realiza el worker del outbox; la petición no espera por él.
+    """
+    if await db.get(User, notification.user_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuario no encontrado."
+        )
+    db_notification = enqueue_notification(db, notification.user_id, notification.mensaje)
+    await db.commit()
+    notification_outbox.wake()
+    return db_notification
+
+@router.get("", response_model=NotificationPage)
+async def list_notifications(
+    cursor: Optional[str] = Query(None, description="Cursor devuelto por la página anterior"),
+    limit: int = Query(50, ge=1, le=200),
+    estado: Optional[bool] = Query(None, description="Filtrar por entregadas (True) o pendientes (False)"),
+    user_id: Optional[int] = Query(None, description="Bandeja de otro usuario (solo administradores)"),
+    current_user: Principal = Depends(get_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Bandeja de notificaciones, de la más reciente a la más antigua.
+    Paginación por cursor sobre (created_at, Id): cada página es un rango del
+    índice ix_notifications_inbox, sin OFFSET, y cuesta lo mismo en la página
+    1 que en la 1000.
+    """
+    owner = _inbox_owner(current_user, user_id)
+    query = select(NotificationDB).where(NotificationDB.User_id == owner)
+    if estado is not None:
+        query = query.where(NotificationDB.Estado == estado)
+    if cursor is not None:
+        query = query.where(tuple_(NotificationDB.created_at, NotificationDB.Id) < _decode_cursor(cursor))
+    query = query.order_by(NotificationDB.created_at.desc(), NotificationDB.Id.desc()).limit(limit + 1)
+
+    items = list(await db.scalars(query))
+    next_cursor = _encode_cursor(items[limit - 1]) if len(items) > limit else None
+    return NotificationPage(items=items[:limit], next_cursor=next_cursor)
+
+@router.get("/unread-count", response_model=UnreadCountOut)
+async def unread_count(
+    user_id: Optional[int] = Query(None, description="Contador de otro usuario (solo administradores)"),
+    current_user: Principal = Depends(get_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Notificaciones pendientes del usuario, leídas del contador mantenido"""
+    return UnreadCountOut(no_leidas=await _unread_count(db, _inbox_owner(current_user, user_id)))
+
+@router.patch("", response_model=NotificationBulkUpdateOut)
+async def bulk_update_notifications(
+    changes: NotificationBulkUpdate,
+    current_user: Principal = Depends(get_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Marcar varias notificaciones como entregadas (o pendientes) con un solo
+    UPDATE. Los usuarios solo afectan a las suyas; los IDs ajenos se ignoran.
+    Devuelve cuántas cambiaron y el contador de no leídas actualizado de cada
+    usuario afectado (para un usuario normal, siempre el suyo).
+    """
+    owner = None if current_user.role == 'admin' else current_user.id
+    changed = await set_notifications_state(db, changes.ids, changes.estado, user_id=owner)
+    await db.commit()
+    affected = set(changed) if owner is None else {owner}
+    return NotificationBulkUpdateOut(
+        actualizadas=sum(changed.values()),
+        no_leidas=await _unread_counts(db, affected) if affected else {},
+    )
+
+@router.websocket("/ws")
+async def notifications_websocket(websocket: WebSocket, token: Optional[str] = Query(None)):
+    """
+    Canal WebSocket de notificaciones en tiempo real.
+    El access token se envía como ``?token=`` (los navegadores no permiten
+    cabeceras en WebSocket) o en la cabecera Authorization.
+    """
+    if token is None:
+        authorization = websocket.headers.get("authorization", "")
+        if authorization.lower().startswith("bearer "):
+            token = authorization[7:]
+    try:
+        user_id = verify_access_token(token or "")
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    subscription = notification_hub.subscribe(user_id)
+
+    async def forward():
+        while True:
+            await websocket.send_text(await subscription.queue.get())
+
+    # Una sola tarea extra por conexión: el handler espera el cierre del
+    # cliente (que no envía nada) mientras ``forward`` reenvía el buffer
+    sender = asyncio.create_task(forward())
+    try:
+        while not sender.done():
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        notification_hub.unsubscribe(subscription)
+
+@router.get("/stream")
+async def notifications_stream(
+    request: Request,
+    current_user: Principal = Depends(get_principal)
+):
+    """Alternativa Server-Sent Events al canal WebSocket"""
+    heartbeat = settings.NOTIFICATIONS_SSE_HEARTBEAT_SECONDS
+
+    async def events():
+        subscription = notification_hub.subscribe(current_user.id)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    # Comentario SSE para mantener viva la conexión a través de proxies
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: notification\ndata: {message}\n\n"
+        finally:
+            notification_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/{notification_id}", response_model=NotificationOut)
+async def get_notification(
+    notification_id: int,
+    current_user: Principal = Depends(get_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await _get_owned_notification(db, notification_id, current_user)
+
+@router.patch("/{notification_id}", response_model=NotificationOut)
+async def update_notification(
+    notification_id: int,
+    changes: NotificationUpdate,
+    current_user: Principal = Depends(get_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Actualizar el estado (o el mensaje, solo administradores) de una notificación"""
+    notification = await _get_owned_notification(db, notification_id, current_user)
+
+    if changes.mensaje is not None:
+        if current_user.role != 'admin':
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Solo los administradores pueden modificar el mensaje."
+            )
+        notification.Mensaje = changes.mensaje
+    if changes.estado is not None:
+        notification.Estado = changes.estado
+
+    await db.commit()
+    return notification
@@ -1,22 +1,144 @@
+import csv
+import io
+import json
+import math
 from datetime import timedelta, datetime
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
-from fastapi import APIRouter, HTTPException, Form, status, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Form, Query, Request, status, Depends
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from models import User, Token, UserLogin
+from models import User, Principal, UserPrincipal, Token, UserLogin
 from utils.auth import (
     create_access_token, create_refresh_token, get_current_user, 
-    get_refresh_token_user, _normalize_email, validate_phone,
+    get_refresh_token_claims, get_user_by_id, get_admin_user, _normalize_email, validate_phone,
     ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS
 )
 
+from utils.hashing import password_hasher, HashingOverloadedError
+from utils.email_filter import email_filter
+from utils.token_store import refresh_token_store
+from utils.rate_limit import get_rate_limiter, is_allowlisted
+from utils.config import settings
+
 # Importar la dependencia de la base de datos
-from database import get_db
+from database import get_async_db, AsyncSessionLocal
 
 router = APIRouter(prefix="/auth", tags=["Autenticación"])
 
-@router.post('/register', response_model=Dict[str, Any])
+# Columnas públicas de un usuario (nunca el hash de la contraseña)
+USER_EXPORT_COLUMNS = [
+    User.id, User.email, User.nombre_completo, User.apellidos, User.direccion,
+    User.edad, User.telefono, User.role, User.is_authorized, User.created_at,
+]
+
+def _export_value(value):
+    """Fechas en ISO 8601 (con 'T'), igual que en la API y en el CSV"""
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+class UserPage(BaseModel):
+    items: List[UserPrincipal]
+    next_cursor: Optional[int] = None
+
+# Esquemas de respuesta: FastAPI valida y serializa cada campo con su tipo
+# (pydantic-core) en lugar de inspeccionar valores sueltos de un Dict[str, Any]
+class UserSummary(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    email: str
+    nombre_completo: str
+    apellidos: str
+    role: str
+    is_authorized: bool
+    created_at: datetime
+
+class RegisterOut(BaseModel):
+    message: str
+    user: UserSummary
+
+class CreatedBy(BaseModel):
+    admin_id: int
+    admin_email: str
+
+class AdminCreateUserOut(RegisterOut):
+    created_by: CreatedBy
+
+class MessageOut(BaseModel):
+    message: str
+
+def _hashing_unavailable() -> HTTPException:
+    """Respuesta 503 cuando la cola de hashing está saturada"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Servicio saturado. Intente de nuevo en unos segundos.",
+        headers={"Retry-After": str(settings.HASHING_RETRY_AFTER_SECONDS)}
+    )
+
+async def _check_login_rate(client_ip: str, email: str):
+    """
+    Consume un intento del cubo de la IP y del cubo del email antes de tocar
+    la base de datos o bcrypt; responde 429 con Retry-After si se agotaron.
+    """
+    if is_allowlisted(client_ip):
+        return
+    limiter = get_rate_limiter()
+    retry_after = await limiter.hit(
+        f"login:ip:{client_ip}", settings.LOGIN_IP_BURST, settings.LOGIN_IP_PER_MINUTE / 60
+    )
+    if not retry_after:
+        retry_after = await limiter.hit(
+            f"login:email:{email}", settings.LOGIN_EMAIL_BURST, settings.LOGIN_EMAIL_PER_MINUTE / 60
+        )
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Demasiados intentos de inicio de sesión. Intente más tarde.",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+
+def _email_taken() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="El email ya está registrado."
+    )
+
+async def _insert_user(db: AsyncSession, user: User, password: str) -> User:
+    """
+    Hashea la contraseña e inserta el usuario confiando en el índice único de
+    email: un duplicado (incluso entre peticiones concurrentes) se convierte
+    en 409. La consulta previa solo se hace si el filtro de Bloom está cargado
+    e indica que el email puede existir, para no pagar el hash de un duplicado
+    evidente; sin filtro se inserta directamente.
+    """
+    if email_filter.ready and email_filter.might_exist(user.email):
+        if await db.scalar(select(User.id).where(User.email == user.email)):
+            raise _email_taken()
+
+    # Establecer la contraseña fuera del event loop
+    try:
+        await password_hasher.set_password(user, password)
+    except HashingOverloadedError:
+        raise _hashing_unavailable()
+
+    db.add(user)
+    try:
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        # El texto del error depende del driver: se confirma con una consulta
+        if await db.scalar(select(User.id).where(User.email == user.email)):
+            email_filter.add(user.email)
+            raise _email_taken()
+        raise e
+    email_filter.add(user.email)
+    return user
+
+@router.post('/register', response_model=RegisterOut)
 async def register(
     email: str = Form(...),
     password: str = Form(...),
@@ -25,7 +147,7 @@ async def register(
     direccion: str = Form(...),
     edad: int = Form(...),
     telefono: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
 
     
@@ -59,13 +181,6 @@ async def register(
             detail="Formato de teléfono inválido (debe tener 10-15 dígitos)."
         )
     
-    # Verificar si el email ya existe
-    if db.query(User).filter(User.email == normalized_email).first():
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="El email ya está registrado."
-        )
-    
     # Crear usuario con rol automático de cliente
     try:
         user = User(
@@ -78,28 +193,14 @@ async def register(
             role="clientes",  # Rol automático para todos los nuevos usuarios
             is_authorized=True,  # Los clientes se autorizan automáticamente
         )
-        
-        # Establecer la contraseña usando el método del modelo
-        user.set_password(password)
-        
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-
-        # Preparar información de respuesta
-        user_info = {
-            "id": user.id,
-            "email": user.email,
-            "nombre_completo": user.nombre_completo,
-            "apellidos": user.apellidos,
-            "role": user.role,
-            "is_authorized": user.is_authorized,
-            "created_at": user.created_at.isoformat()
-        }
-        return {
-            "message": "Usuario registrado exitosamente como cliente.",
-            "user": user_info
-        }
+
+        # El email duplicado lo detecta el índice único (409)
+        await _insert_user(db, user, password)
+
+        return RegisterOut(
+            message="Usuario registrado exitosamente como cliente.",
+            user=UserSummary.model_validate(user),
+        )
     except HTTPException:
         # Re-lanzar HTTPException tal como están
         raise
@@ -107,18 +208,18 @@ async def register(
         # Limpiar usuario si hay error
         try:
             if 'user' in locals() and user.id:
-                db.delete(user)
-                db.commit()
+                await db.delete(user)
+                await db.commit()
         except:
             pass
         
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error interno del servidor."
         )
 @router.post("/login", response_model=Token)
-async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(user_credentials: UserLogin, request: Request, db: AsyncSession = Depends(get_async_db)):
     try:
         email = _normalize_email(user_credentials.email)
     except ValueError as ve:
@@ -126,8 +227,12 @@ async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Email inválido: {ve}"
         )
+    
+    # Límite de intentos antes de cualquier consulta o hash
+    client_ip = request.client.host if request.client else ""
+    await _check_login_rate(client_ip, email.lower())
 
-    user = db.query(User).filter(User.email == email).first()
+    user = await db.scalar(select(User).where(User.email == email))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -135,7 +240,9 @@ async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
         )
     
     try:
-        password_valid = user.check_password(user_credentials.password)
+        password_valid, rehashed = await password_hasher.verify_and_update(user, user_credentials.password)
+    except HashingOverloadedError:
+        raise _hashing_unavailable()
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -155,6 +262,13 @@ async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
             detail="Usuario no autorizado. Contacte al administrador."
         )
     
+    # Guardar el hash actualizado a la política vigente (solo una vez por usuario)
+    if rehashed:
+        await db.commit()
+    
+    # Un login correcto devuelve sus intentos al usuario
+    await get_rate_limiter().reset(f"login:email:{email.lower()}")
+    
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     refresh_token_expires = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     
@@ -177,29 +291,37 @@ async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
         "token_type": "bearer"
     }
 
-@router.get("/me", response_model=Dict[str, Any])
+@router.get("/me", response_model=UserPrincipal)
 async def get_current_user_info(
-    current_user: User = Depends(get_current_user)
+    current_user: UserPrincipal = Depends(get_current_user)
 ):
     """Obtener información del usuario actual"""
-    return {
-        "id": current_user.id,
-        "email": current_user.email,
-        "nombre_completo": current_user.nombre_completo,
-        "apellidos": current_user.apellidos,
-        "direccion": current_user.direccion,
-        "edad": current_user.edad,
-        "telefono": current_user.telefono,
-        "role": current_user.role,
-        "is_authorized": current_user.is_authorized,
-        "created_at": current_user.created_at.isoformat()
-    }
+    return current_user
 
 @router.post("/refresh", response_model=Token)
 async def refresh_access_token(
-    current_user: User = Depends(get_refresh_token_user)
+    claims: Dict[str, Any] = Depends(get_refresh_token_claims)
 ):
-    """Generar un nuevo access token usando el refresh token"""
+    """
+    Generar un nuevo par de tokens usando el refresh token.
+    El refresh token presentado se consume (rotación): si se vuelve a usar se
+    revoca la sesión completa.
+    """
+    if not await refresh_token_store.rotate(claims["jti"], claims["fam"], claims["exp"]):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token revocado",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    # Rol y autorización actuales (a través de la caché de usuarios)
+    current_user = await get_user_by_id(int(claims["sub"]))
+    if not current_user.is_authorized:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Usuario no autorizado. Contacte al administrador."
+        )
+    
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     refresh_token_expires = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     
@@ -212,7 +334,7 @@ async def refresh_access_token(
         expires_delta=access_token_expires
     )
     refresh_token = create_refresh_token(
-        data={"sub": str(current_user.id)},
+        data={"sub": str(current_user.id), "fam": claims["fam"]},
         expires_delta=refresh_token_expires
     )
     
@@ -222,7 +344,18 @@ async def refresh_access_token(
         "token_type": "bearer"
     }
 
-@router.post('/admin/create-user', response_model=Dict[str, Any])
+@router.post("/logout", response_model=MessageOut)
+async def logout(
+    claims: Dict[str, Any] = Depends(get_refresh_token_claims)
+):
+    """
+    Cerrar la sesión del refresh token presentado: ningún refresh token de la
+    sesión vuelve a ser válido. El access token vigente caduca por sí solo.
+    """
+    await refresh_token_store.revoke_family(claims["fam"])
+    return {"message": "Sesión cerrada."}
+
+@router.post('/admin/create-user', response_model=AdminCreateUserOut)
 async def create_user_as_admin(
     email: str = Form(...),
     password: str = Form(...),
@@ -232,21 +365,14 @@ async def create_user_as_admin(
     edad: int = Form(...),
     telefono: str = Form(...),
     role: str = Form(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Endpoint para que los administradores puedan crear usuarios con cualquier rol.
-    Solo accesible por usuarios con rol 'admin'.
+    Solo accesible por usuarios con rol 'admin' (verificado con los claims del token).
     """
     
-    # Verificar que el usuario actual es administrador
-    if current_user.role != 'admin':
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Solo los administradores pueden crear usuarios con roles específicos."
-        )
-    
     # Validar datos del formulario
     try:
         normalized_email = _normalize_email(email)
@@ -285,13 +411,6 @@ async def create_user_as_admin(
             detail=f"Rol inválido. Roles válidos: {', '.join(valid_roles)}"
         )
     
-    # Verificar si el email ya existe
-    if db.query(User).filter(User.email == normalized_email).first():
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="El email ya está registrado."
-        )
-    
     # Crear usuario con el rol especificado
     try:
         user = User(
@@ -304,32 +423,15 @@ async def create_user_as_admin(
             role=role,
             is_authorized=True,  # Los usuarios creados por admin se autorizan automáticamente
         )
-        
-        # Establecer la contraseña usando el método del modelo
-        user.set_password(password)
-        
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-
-        # Preparar información de respuesta
-        user_info = {
-            "id": user.id,
-            "email": user.email,
-            "nombre_completo": user.nombre_completo,
-            "apellidos": user.apellidos,
-            "role": user.role,
-            "is_authorized": user.is_authorized,
-            "created_at": user.created_at.isoformat()
-        }
-        return {
-            "message": f"Usuario registrado exitosamente con rol '{role}' por el administrador.",
-            "user": user_info,
-            "created_by": {
-                "admin_id": current_user.id,
-                "admin_email": current_user.email
-            }
-        }
+
+        # El email duplicado lo detecta el índice único (409)
+        await _insert_user(db, user, password)
+
+        return AdminCreateUserOut(
+            message=f"Usuario registrado exitosamente con rol '{role}' por el administrador.",
+            user=UserSummary.model_validate(user),
+            created_by=CreatedBy(admin_id=current_user.id, admin_email=current_user.email),
+        )
     except HTTPException:
         # Re-lanzar HTTPException tal como están
         raise
@@ -337,13 +439,93 @@ async def create_user_as_admin(
         # Limpiar usuario si hay error
         try:
             if 'user' in locals() and user.id:
-                db.delete(user)
-                db.commit()
+                await db.delete(user)
+                await db.commit()
         except:
             pass
         
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error interno del servidor."
-        )
\ No newline at end of file
+        )
+
+def _users_query(role: Optional[str]):
+    query = select(*USER_EXPORT_COLUMNS)
+    if role is not None:
+        query = query.where(User.role == role)
+    return query.order_by(User.id)
+
+@router.get('/admin/users', response_model=UserPage)
+async def list_users(
+    role: Optional[str] = Query(None, description="Filtrar por rol"),
+    cursor: Optional[int] = Query(None, description="Último id de la página anterior"),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: Principal = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Listado de usuarios paginado por cursor (id), solo administradores.
+    Con filtro de rol la consulta recorre el índice (role, id) desde el cursor.
+    """
+    query = _users_query(role)
+    if cursor is not None:
+        query = query.where(User.id > cursor)
+    rows = (await db.execute(query.limit(limit + 1))).mappings().all()
+    items = [UserPrincipal.model_validate(row) for row in rows[:limit]]
+    next_cursor = items[-1].id if len(rows) > limit else None
+    return UserPage(items=items, next_cursor=next_cursor)
+
+@router.get('/admin/users/export')
+async def export_users(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    role: Optional[str] = Query(None, description="Filtrar por rol"),
+    current_user: Principal = Depends(get_admin_user)
+):
+    """
+    Exportación completa de usuarios en NDJSON o CSV, solo administradores.
+    Se lee con un cursor del servidor (yield_per) y se envía mientras se lee,
+    así la memoria no depende del tamaño de la tabla.
+    """
+    names = [column.key for column in USER_EXPORT_COLUMNS]
+    query = _users_query(role).execution_options(yield_per=1000)
+
+    async def rows():
+        # La sesión de la dependencia se cierra antes de enviar el cuerpo:
+        # el generador abre la suya
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(query)
+            async for partition in result.partitions():
+                yield partition
+
+    async def ndjson():
+        async for partition in rows():
+            yield "".join(
+                json.dumps(dict(zip(names, row)), default=_export_value, ensure_ascii=False) + "\n"
+                for row in partition
+            )
+
+    async def csv_lines():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(names)
+        async for partition in rows():
+            writer.writerows(
+                [value.isoformat() if isinstance(value, datetime) else value for value in row]
+                for row in partition
+            )
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    if format == "csv":
+        content, media_type, extension = csv_lines(), "text/csv", "csv"
+    else:
+        content, media_type, extension = ndjson(), "application/x-ndjson", "ndjson"
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="usuarios.{extension}"'}
+    )
@@ -1,16 +1,23 @@
 """
 Utilidades de autenticación simplificadas para evitar problemas con FastAPI OpenAPI
 """
+import hashlib
 import os
 import re
+import threading
+import time
+import uuid
 from datetime import timedelta, datetime, timezone
 from typing import Optional, Dict, Any
 
 from fastapi import HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from cachetools import TLRUCache
 from jose import JWTError, jwt
 
+from utils.config import settings
+from utils.metrics import record_jwt
+
 # Configuración JWT
 SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'super-secret')
 ALGORITHM = "HS256"
@@ -31,25 +38,79 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
+    """
+    Emite un refresh token con identificador propio (jti). ``fam`` identifica
+    la sesión: se conserva al rotar y se genera uno nuevo si no se indica.
+    """
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.now(timezone.utc) + expires_delta
     else:
         expire = datetime.now(timezone.utc) + timedelta(days=7)
-    to_encode.update({"exp": expire, "type": "refresh"})
+    to_encode.setdefault("fam", uuid.uuid4().hex)
+    to_encode.update({"exp": expire, "type": "refresh", "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+# Caché de tokens ya verificados: la clave es el digest del token y cada
+# entrada caduca en el instante ``exp`` del propio token
+def _token_expiration(key, payload, now):
+    return payload.get("exp", now)
+
+_verified_tokens = TLRUCache(
+    maxsize=max(settings.TOKEN_CACHE_MAXSIZE, 1),
+    ttu=_token_expiration,
+    timer=time.time,
+)
+_verified_tokens_lock = threading.Lock()
+_token_cache_counters = {"hits": 0, "misses": 0}
+
+def token_cache_stats() -> Dict[str, Any]:
+    """Contadores de aciertos y fallos de la caché de tokens verificados"""
+    with _verified_tokens_lock:
+        hits = _token_cache_counters["hits"]
+        misses = _token_cache_counters["misses"]
+        total = hits + misses
+        return {
+            "size": len(_verified_tokens),
+            "maxsize": _verified_tokens.maxsize,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / total, 4) if total else 0.0,
+        }
+
+def clear_token_cache():
+    with _verified_tokens_lock:
+        _verified_tokens.clear()
+
 def decode_token(token: str) -> Dict[str, Any]:
+    use_cache = settings.TOKEN_CACHE_MAXSIZE > 0
+    if use_cache:
+        key = hashlib.sha256(token.encode('utf-8')).digest()
+        with _verified_tokens_lock:
+            payload = _verified_tokens.get(key)
+            if payload is not None:
+                _token_cache_counters["hits"] += 1
+                return dict(payload)
+            _token_cache_counters["misses"] += 1
+    
+    started = time.perf_counter()
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except JWTError:
+        record_jwt(time.perf_counter() - started)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token inválido",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    record_jwt(time.perf_counter() - started)
+    
+    # Solo se cachean tokens con expiración; los demás se verifican siempre
+    if use_cache and "exp" in payload:
+        with _verified_tokens_lock:
+            _verified_tokens[key] = dict(payload)
+    return payload
 
 # Funciones auxiliares sin dependencias complejas
 def verify_access_token(token: str):
@@ -71,8 +132,10 @@ def verify_access_token(token: str):
     
     return int(user_id)
 
-def verify_refresh_token(token: str):
-    """Verifica y decodifica un refresh token"""
+def verify_refresh_claims(token: str) -> Dict[str, Any]:
+    """Verifica un refresh token y que no esté revocado; devuelve sus claims"""
+    from utils.token_store import refresh_token_store
+    
     payload = decode_token(token)
     
     if payload.get("type") != "refresh":
@@ -81,52 +144,129 @@ def verify_refresh_token(token: str):
             detail="Se requiere refresh token"
         )
     
-    user_id = payload.get("sub")
-    if user_id is None:
+    # Los refresh tokens sin jti (emitidos antes de la rotación) no se aceptan
+    if payload.get("sub") is None or payload.get("jti") is None or payload.get("fam") is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token inválido"
         )
     
-    return int(user_id)
+    if refresh_token_store.is_revoked(payload["fam"]):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token revocado",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    return payload
 
-def get_user_by_id(user_id: int):
-    """Obtiene un usuario por ID desde la base de datos"""
-    from database import get_db
-    from models import User
+def verify_refresh_token(token: str):
+    """Verifica y decodifica un refresh token"""
+    return int(verify_refresh_claims(token)["sub"])
+
+async def get_user_by_id(user_id: int, use_cache: bool = True):
+    """
+    Obtiene un usuario por ID, primero desde la caché y luego desde la base de datos.
+    Con ``use_cache=False`` siempre lee de la base de datos (y refresca la caché).
+    """
+    from database import AsyncSessionLocal
+    from models import User, UserPrincipal
+    from utils.user_cache import get_user_cache
     
-    db_gen = get_db()
-    db = next(db_gen)
-    try:
-        user = db.query(User).filter(User.id == user_id).first()
+    cache = get_user_cache()
+    if use_cache:
+        cached = await cache.get(user_id)
+        if cached is not None:
+            return UserPrincipal.model_validate(cached)
+    
+    async with AsyncSessionLocal() as db:
+        user = await db.get(User, user_id)
         if user is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Usuario no encontrado"
             )
-        return user
-    finally:
-        db.close()
+        principal = UserPrincipal.model_validate(user)
+    
+    await cache.set(user_id, principal.model_dump(mode="json"))
+    return principal
 
 # Dependencias simplificadas
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Dependencia para obtener el usuario actual"""
     user_id = verify_access_token(credentials.credentials)
-    return get_user_by_id(user_id)
+    return await get_user_by_id(user_id)
 
-def get_refresh_token_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_refresh_token_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Dependencia para obtener usuario desde refresh token"""
     user_id = verify_refresh_token(credentials.credentials)
-    return get_user_by_id(user_id)
+    return await get_user_by_id(user_id)
+
+async def get_refresh_token_claims(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Dependencia con los claims de un refresh token vigente y no revocado"""
+    return verify_refresh_claims(credentials.credentials)
 
-def get_admin_user(current_user = Depends(get_current_user)):
-    """Dependencia para verificar permisos de administrador"""
-    if current_user.role != 'admin':
+def principal_from_token(token: str):
+    """Construye el Principal solo con los claims verificados del access token"""
+    from models import Principal
+    
+    payload = decode_token(token)
+    
+    if payload.get("type") != "access":
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Se requieren permisos de administrador"
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Tipo de token inválido"
         )
-    return current_user
+    
+    user_id = payload.get("sub")
+    email = payload.get("email")
+    role = payload.get("role")
+    if user_id is None or email is None or role is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido"
+        )
+    
+    return Principal(id=int(user_id), email=email, role=role)
+
+async def get_principal(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Dependencia sin acceso a base de datos: identidad tomada del token"""
+    return principal_from_token(credentials.credentials)
+
+def require_role(*roles: str, strict: Optional[bool] = None):
+    """
+    Crea una dependencia que exige uno de los roles indicados.
+    
+    Por defecto confía en el rol firmado en el token (sin E/S). En modo
+    estricto lee el usuario directamente de la base de datos, sin pasar por la
+    caché de usuarios (que es por proceso y solo se invalida en el worker que
+    hizo el cambio), para detectar cambios de rol o de autorización
+    posteriores a la emisión del token.
+    """
+    if strict is None:
+        strict = settings.AUTH_STRICT_ROLE_CHECKS
+    
+    async def dependency(credentials: HTTPAuthorizationCredentials = Depends(security)):
+        principal = principal_from_token(credentials.credentials)
+        if strict:
+            principal = await get_user_by_id(principal.id, use_cache=False)
+            if not principal.is_authorized:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="Usuario no autorizado. Contacte al administrador."
+                )
+        if principal.role not in roles:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Se requieren permisos de administrador" if roles == ('admin',)
+                else "Permisos insuficientes"
+            )
+        return principal
+    
+    return dependency
+
+# Dependencia para verificar permisos de administrador
+get_admin_user = require_role('admin')
 
 # Validaciones y utilidades
 def _normalize_email(email: str) -> str:
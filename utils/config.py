@@ -6,13 +6,78 @@ class Settings:
     
     # Base de datos
     DATABASE_URL: str = os.getenv('DATABASE_URL', 'sqlite:///./api_booking.db')
+    # URL para el engine asíncrono; si se omite se deriva de DATABASE_URL
+    # (sqlite -> sqlite+aiosqlite, postgresql -> postgresql+asyncpg)
+    ASYNC_DATABASE_URL: str = os.getenv('ASYNC_DATABASE_URL', '')
+    DB_POOL_SIZE: int = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW: int = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT: int = int(os.getenv('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE: int = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING: bool = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
     
     # JWT
     JWT_SECRET_KEY: str = os.getenv('JWT_SECRET_KEY', 'super-secret')
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv('ACCESS_TOKEN_EXPIRES', 15))
     REFRESH_TOKEN_EXPIRE_DAYS: int = int(os.getenv('REFRESH_TOKEN_EXPIRES_DAYS', 7))
-    
+    # Caché de tokens verificados (0 = desactivada)
+    TOKEN_CACHE_MAXSIZE: int = int(os.getenv('TOKEN_CACHE_MAXSIZE', 50000))
+    # Revalidar contra la base de datos los roles incluidos en el token
+    AUTH_STRICT_ROLE_CHECKS: bool = os.getenv('AUTH_STRICT_ROLE_CHECKS', 'false').lower() in ('1', 'true', 'yes')
+    # Revocación de refresh tokens: persistir en la tabla revoked_tokens (para
+    # varios workers o reinicios) y cada cuánto leer las revocaciones ajenas
+    REFRESH_STORE_PERSIST: bool = os.getenv('REFRESH_STORE_PERSIST', 'false').lower() in ('1', 'true', 'yes')
+    REFRESH_STORE_SYNC_SECONDS: float = float(os.getenv('REFRESH_STORE_SYNC_SECONDS', 5))
+    REFRESH_STORE_SYNC_OVERLAP_SECONDS: float = float(os.getenv('REFRESH_STORE_SYNC_OVERLAP_SECONDS', 30))
+
+    # Caché de usuarios autenticados (TTL 0 = desactivada)
+    USER_CACHE_TTL_SECONDS: int = int(os.getenv('USER_CACHE_TTL_SECONDS', 60))
+    USER_CACHE_MAXSIZE: int = int(os.getenv('USER_CACHE_MAXSIZE', 10000))
+
+    # Índice de disponibilidad en memoria
+    AVAILABILITY_INDEX_ENABLED: bool = os.getenv('AVAILABILITY_INDEX_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    AVAILABILITY_INDEX_MAX_AGE_SECONDS: int = int(os.getenv('AVAILABILITY_INDEX_MAX_AGE_SECONDS', 30))
+
+    # Envío de notificaciones (outbox)
+    NOTIFICATIONS_WORKER_ENABLED: bool = os.getenv('NOTIFICATIONS_WORKER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    NOTIFICATIONS_BATCH_SIZE: int = int(os.getenv('NOTIFICATIONS_BATCH_SIZE', 100))
+    NOTIFICATIONS_POLL_SECONDS: float = float(os.getenv('NOTIFICATIONS_POLL_SECONDS', 2))
+    NOTIFICATIONS_MAX_ATTEMPTS: int = int(os.getenv('NOTIFICATIONS_MAX_ATTEMPTS', 5))
+    NOTIFICATIONS_BACKOFF_SECONDS: float = float(os.getenv('NOTIFICATIONS_BACKOFF_SECONDS', 5))
+    NOTIFICATIONS_BACKOFF_MAX_SECONDS: float = float(os.getenv('NOTIFICATIONS_BACKOFF_MAX_SECONDS', 600))
+    NOTIFICATIONS_LEASE_SECONDS: float = float(os.getenv('NOTIFICATIONS_LEASE_SECONDS', 60))
+    # Tiempo real: mensajes en buffer por conexión y latido de SSE
+    NOTIFICATIONS_STREAM_BUFFER: int = int(os.getenv('NOTIFICATIONS_STREAM_BUFFER', 100))
+    NOTIFICATIONS_SSE_HEARTBEAT_SECONDS: float = float(os.getenv('NOTIFICATIONS_SSE_HEARTBEAT_SECONDS', 15))
+
+    # Hashing de contraseñas (0 = min(4, número de CPUs))
+    HASHING_WORKERS: int = int(os.getenv('HASHING_WORKERS', 0))
+    HASHING_MAX_QUEUE: int = int(os.getenv('HASHING_MAX_QUEUE', 64))
+    HASHING_RETRY_AFTER_SECONDS: int = int(os.getenv('HASHING_RETRY_AFTER_SECONDS', 1))
+
+    # Política de hashing de contraseñas ('bcrypt' o 'argon2'). Los hashes con
+    # otros parámetros se recalculan al iniciar sesión. Calibrar con
+    # python utils/passwords.py --calibrate
+    PASSWORD_SCHEME: str = os.getenv('PASSWORD_SCHEME', 'bcrypt')
+    BCRYPT_ROUNDS: int = int(os.getenv('BCRYPT_ROUNDS', 12))
+    ARGON2_TIME_COST: int = int(os.getenv('ARGON2_TIME_COST', 3))
+    ARGON2_MEMORY_COST: int = int(os.getenv('ARGON2_MEMORY_COST', 65536))
+    ARGON2_PARALLELISM: int = int(os.getenv('ARGON2_PARALLELISM', 4))
+
+    # Límite de intentos de login (token bucket por IP y por email); las IPs
+    # de ALLOWED_CIDRS quedan exentas
+    LOGIN_RATE_LIMIT_ENABLED: bool = os.getenv('LOGIN_RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    LOGIN_IP_BURST: int = int(os.getenv('LOGIN_IP_BURST', 20))
+    LOGIN_IP_PER_MINUTE: float = float(os.getenv('LOGIN_IP_PER_MINUTE', 10))
+    LOGIN_EMAIL_BURST: int = int(os.getenv('LOGIN_EMAIL_BURST', 5))
+    LOGIN_EMAIL_PER_MINUTE: float = float(os.getenv('LOGIN_EMAIL_PER_MINUTE', 2))
+    RATE_LIMIT_MAXSIZE: int = int(os.getenv('RATE_LIMIT_MAXSIZE', 100000))
+
+    # Filtro de Bloom de emails registrados (evita consultas previas al registro)
+    EMAIL_FILTER_ENABLED: bool = os.getenv('EMAIL_FILTER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    EMAIL_FILTER_CAPACITY: int = int(os.getenv('EMAIL_FILTER_CAPACITY', 1000000))
+    EMAIL_FILTER_ERROR_RATE: float = float(os.getenv('EMAIL_FILTER_ERROR_RATE', 0.001))
+
     # CORS
     ALLOWED_ORIGINS: List[str] = [
         # Desarrollo local
@@ -42,6 +107,31 @@ class Settings:
         '74.220.56.0/24'
     ]
     
+    # Filtrado por IP: 'off' (solo DENIED_CIDRS) o 'allowlist' (solo se
+    # admiten ALLOWED_CIDRS). IP_FILTER_PATHS limita el filtro a esos prefijos
+    IP_FILTER_MODE: str = os.getenv('IP_FILTER_MODE', 'off')
+    IP_FILTER_PATHS: List[str] = [p for p in os.getenv('IP_FILTER_PATHS', '').split(',') if p]
+    DENIED_CIDRS: List[str] = [c for c in os.getenv('DENIED_CIDRS', '').split(',') if c]
+    # Proxies cuyo X-Forwarded-For se acepta para conocer la IP del cliente
+    TRUSTED_PROXIES: List[str] = [c for c in os.getenv('TRUSTED_PROXIES', '').split(',') if c]
+    
+    # Métricas en /metrics (formato Prometheus) y cabecera Server-Timing
+    METRICS_ENABLED: bool = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    SERVER_TIMING_ENABLED: bool = os.getenv('SERVER_TIMING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    
+    # Vigilancia del event loop: retardo en /metrics y, en modo depuración,
+    # pila y ruta de lo que lo bloquea más de LOOP_LAG_THRESHOLD_MS
+    LOOP_MONITOR_ENABLED: bool = os.getenv('LOOP_MONITOR_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    LOOP_MONITOR_INTERVAL: float = float(os.getenv('LOOP_MONITOR_INTERVAL', 0.1))
+    LOOP_LAG_THRESHOLD_MS: float = float(os.getenv('LOOP_LAG_THRESHOLD_MS', 100))
+    LOOP_MONITOR_DEBUG: bool = os.getenv('LOOP_MONITOR_DEBUG', 'false').lower() in ('1', 'true', 'yes')
+    
+    # Sonda /ready: ping a la base de datos cacheado y umbrales de saturación
+    READY_CACHE_SECONDS: float = float(os.getenv('READY_CACHE_SECONDS', 2))
+    READY_DB_TIMEOUT_SECONDS: float = float(os.getenv('READY_DB_TIMEOUT_SECONDS', 1))
+    READY_HASH_QUEUE_RATIO: float = float(os.getenv('READY_HASH_QUEUE_RATIO', 0.8))
+    READY_MAX_LOOP_LAG_MS: float = float(os.getenv('READY_MAX_LOOP_LAG_MS', 500))
+    
     # Roles válidos
     VALID_ROLES: List[str] = [
         'admin', 'clientes'
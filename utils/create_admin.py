@@ -3,22 +3,40 @@
 Script para crear usuarios administradores directamente en la base de datos.
 Útil para crear el primer admin o agregar admins adicionales.
 
+También importa usuarios de forma masiva desde CSV o JSONL (una fila por
+usuario con las columnas email, password, nombre_completo, apellidos,
+direccion, edad, telefono y, opcionalmente, role e is_authorized; en lugar de
+password se acepta password_hash con un hash bcrypt o argon2 ya calculado,
+que se actualiza a la política vigente en el primer inicio de sesión).
+
 Uso:
     python create_admin.py
     python create_admin.py --email admin@example.com --password mypass123
+    python create_admin.py --import usuarios.csv --chunk-size 1000 --workers 8
 """
 
 import argparse
+import csv
+import json
 import sys
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 from getpass import getpass
 
 # Agregar el directorio padre al path para importar módulos
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, parent_dir)
 
-from database import get_db, init_db
-from models import User
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+from database import get_db, init_db, SessionLocal
+from models import User, hash_password
+from utils.passwords import pwd_context
+from utils.config import settings
+from utils.hashing import password_hasher
 
 # Importar funciones de validación directamente
 import re
@@ -103,8 +121,8 @@ def create_admin_user(email, password, nombre_completo, apellidos, direccion, ed
             is_authorized=True,  # Los admins se autorizan automáticamente
         )
         
-        # Establecer la contraseña
-        admin_user.set_password(password)
+        # Establecer la contraseña usando el servicio de hashing compartido
+        password_hasher.run_sync(admin_user.set_password, password)
         
         # Guardar en la base de datos
         db.add(admin_user)
@@ -209,17 +227,17 @@ def list_existing_admins():
     db = next(db_gen)
     
     try:
-        # Buscar todos los administradores
-        admins = db.query(User).filter(User.role == "admin").all()
-        
-        if not admins:
-            print("📋 No hay administradores en la base de datos.")
-            return
-        
-        print("📋 ADMINISTRADORES EXISTENTES:")
-        print("=" * 50)
+        # Recorrer los administradores con un cursor del servidor, por lotes
+        admins = db.scalars(
+            select(User).where(User.role == "admin").order_by(User.id)
+            .execution_options(yield_per=500)
+        )
         
+        i = 0
         for i, admin in enumerate(admins, 1):
+            if i == 1:
+                print("📋 ADMINISTRADORES EXISTENTES:")
+                print("=" * 50)
             status = "✅ Autorizado" if admin.is_authorized else "❌ No autorizado"
             print(f"{i}. ID: {admin.id}")
             print(f"   Email: {admin.email}")
@@ -227,6 +245,9 @@ def list_existing_admins():
             print(f"   Estado: {status}")
             print(f"   Creado: {admin.created_at}")
             print()
+        
+        if i == 0:
+            print("📋 No hay administradores en la base de datos.")
     
     except Exception as e:
         print(f"❌ Error al listar administradores: {e}")
@@ -234,6 +255,191 @@ def list_existing_admins():
     finally:
         db.close()
 
+def _read_rows(path: str):
+    """Lee el archivo de importación fila a fila: (número de línea, dict)"""
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.lower().endswith(('.jsonl', '.ndjson')):
+            for line_number, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        yield line_number, json.loads(line)
+                    except json.JSONDecodeError as e:
+                        yield line_number, ValueError(f"JSON inválido: {e}")
+        else:
+            # La línea 1 es la cabecera
+            for line_number, row in enumerate(csv.DictReader(f), 2):
+                yield line_number, row
+
+def _validate_row(row, default_role: str):
+    """
+    Aplica las mismas reglas que el registro. Devuelve (mapping, password)
+    listo para insertar o lanza ValueError con el motivo.
+    """
+    if isinstance(row, Exception):
+        raise row
+    if not isinstance(row, dict):
+        raise ValueError("La fila debe ser un objeto JSON")
+    try:
+        email = _normalize_email(str(row.get("email") or ""))
+    except ValueError as e:
+        raise ValueError(f"Email inválido: {e}")
+
+    password = str(row.get("password") or "")
+    password_hash = str(row.get("password_hash") or "").strip()
+    if password_hash:
+        if pwd_context.identify(password_hash) is None:
+            raise ValueError("password_hash no es un hash bcrypt ni argon2")
+    elif len(password) < 6:
+        raise ValueError("La contraseña debe tener al menos 6 caracteres")
+
+    try:
+        edad = int(row.get("edad"))
+    except (TypeError, ValueError):
+        raise ValueError("La edad debe ser un número")
+    if edad < 18 or edad > 120:
+        raise ValueError("La edad debe estar entre 18 y 120 años")
+
+    telefono = str(row.get("telefono") or "").strip()
+    if not validate_phone(telefono):
+        raise ValueError("Formato de teléfono inválido (debe tener 10-15 dígitos)")
+
+    role = str(row.get("role") or default_role).strip()
+    if role not in settings.VALID_ROLES:
+        raise ValueError(f"Rol inválido: {role}")
+
+    fields = {}
+    for field in ("nombre_completo", "apellidos", "direccion"):
+        value = str(row.get(field) or "").strip()
+        if not value:
+            raise ValueError(f"Falta {field}")
+        fields[field] = value
+
+    is_authorized = row.get("is_authorized", True)
+    if isinstance(is_authorized, str):
+        is_authorized = is_authorized.strip().lower() in ("1", "true", "t", "s", "si", "sí", "yes")
+
+    mapping = {
+        "email": email,
+        "password_hash": password_hash or None,
+        "edad": edad,
+        "telefono": telefono,
+        "role": role,
+        "is_authorized": bool(is_authorized),
+        **fields,
+    }
+    return mapping, None if password_hash else password
+
+def _insert_chunk(db, mappings):
+    """
+    Inserta un lote con un único executemany en su propia transacción. Si
+    otro proceso registró alguno de los emails entretanto, se reintenta fila
+    a fila para conservar el resto. Devuelve (insertados, duplicados).
+    """
+    if not mappings:
+        return 0, 0
+    try:
+        db.execute(insert(User), mappings)
+        db.commit()
+        return len(mappings), 0
+    except IntegrityError:
+        db.rollback()
+
+    inserted = 0
+    for mapping in mappings:
+        try:
+            db.execute(insert(User), [mapping])
+            db.commit()
+            inserted += 1
+        except IntegrityError:
+            db.rollback()
+    return inserted, len(mappings) - inserted
+
+def bulk_import_users(path, chunk_size=1000, workers=None, default_role="clientes", errors_path=None):
+    """
+    Importa usuarios en lotes: valida cada fila, descarta emails ya existentes
+    (una consulta por lote), hashea las contraseñas del lote en un pool de
+    procesos e inserta con executemany en una transacción por lote.
+
+    Returns:
+        dict: Resumen con insertados, duplicados, inválidos, segundos y filas/s
+    """
+    init_db()
+    workers = workers or os.cpu_count() or 1
+    summary = {"leidas": 0, "insertados": 0, "duplicados": 0, "invalidos": 0}
+    rejected = []
+    seen = set()
+    started = time.perf_counter()
+
+    def flush(db, pool, batch):
+        emails = [mapping["email"] for mapping, _ in batch]
+        existing = set(db.scalars(select(User.email).where(User.email.in_(emails))))
+        batch = [(mapping, password) for mapping, password in batch if mapping["email"] not in existing]
+        summary["duplicados"] += len(emails) - len(batch)
+
+        # Solo se hashea lo que se va a insertar
+        pending = [(mapping, password) for mapping, password in batch if password is not None]
+        hashes = pool.map(hash_password, [password for _, password in pending],
+                          chunksize=max(1, len(pending) // (workers * 4)))
+        for (mapping, _), password_hash in zip(pending, hashes):
+            mapping["password_hash"] = password_hash
+
+        now = datetime.now()
+        mappings = [{**mapping, "created_at": now} for mapping, _ in batch]
+        inserted, duplicated = _insert_chunk(db, mappings)
+        summary["insertados"] += inserted
+        summary["duplicados"] += duplicated
+
+        elapsed = time.perf_counter() - started
+        print(f"   ... {summary['leidas']} filas leídas, {summary['insertados']} insertadas "
+              f"({summary['insertados'] / elapsed:,.0f} filas/s)")
+
+    db = SessionLocal()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            batch = []
+            for line_number, row in _read_rows(path):
+                summary["leidas"] += 1
+                try:
+                    mapping, password = _validate_row(row, default_role)
+                except ValueError as e:
+                    summary["invalidos"] += 1
+                    rejected.append((line_number, str(row.get("email", "")) if isinstance(row, dict) else "", str(e)))
+                    continue
+                if mapping["email"] in seen:
+                    summary["duplicados"] += 1
+                    rejected.append((line_number, mapping["email"], "Email repetido en el archivo"))
+                    continue
+                seen.add(mapping["email"])
+                batch.append((mapping, password))
+                if len(batch) >= chunk_size:
+                    flush(db, pool, batch)
+                    batch = []
+            if batch:
+                flush(db, pool, batch)
+    finally:
+        db.close()
+
+    summary["segundos"] = round(time.perf_counter() - started, 2)
+    summary["filas_por_segundo"] = round(summary["leidas"] / summary["segundos"], 1) if summary["segundos"] else 0.0
+
+    if errors_path and rejected:
+        with open(errors_path, "w", newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["linea", "email", "motivo"])
+            writer.writerows(rejected)
+
+    print("✅ Importación terminada")
+    print(f"   Filas leídas: {summary['leidas']}")
+    print(f"   Insertados: {summary['insertados']}")
+    print(f"   Duplicados: {summary['duplicados']}")
+    print(f"   Inválidos: {summary['invalidos']}")
+    print(f"   Tiempo: {summary['segundos']} s ({summary['filas_por_segundo']:,} filas/s)")
+    for line_number, email, reason in rejected[:10]:
+        print(f"   ⚠️  Línea {line_number} {email}: {reason}")
+    if len(rejected) > 10:
+        print(f"   ... y {len(rejected) - 10} rechazos más" + (f" (ver {errors_path})" if errors_path else ""))
+    return summary
+
 def main():
     parser = argparse.ArgumentParser(description="Crear usuarios administradores en la base de datos")
     parser.add_argument("--email", help="Email del administrador")
@@ -244,9 +450,26 @@ def main():
     parser.add_argument("--edad", type=int, help="Edad del administrador")
     parser.add_argument("--telefono", help="Teléfono del administrador")
     parser.add_argument("--list", action="store_true", help="Listar administradores existentes")
+    parser.add_argument("--import", dest="import_path", help="Importar usuarios desde un archivo CSV o JSONL")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Usuarios por transacción al importar")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos para hashear contraseñas (por defecto, uno por CPU)")
+    parser.add_argument("--role", default="clientes", help="Rol de las filas que no lo indican")
+    parser.add_argument("--errors", help="CSV donde guardar las filas rechazadas")
     
     args = parser.parse_args()
     
+    # Importación masiva
+    if args.import_path:
+        print(f"🚀 Importando usuarios desde {args.import_path}...")
+        bulk_import_users(
+            args.import_path,
+            chunk_size=args.chunk_size,
+            workers=args.workers,
+            default_role=args.role,
+            errors_path=args.errors
+        )
+        return
+    
     # Si se solicita listar administradores
     if args.list:
         list_existing_admins()
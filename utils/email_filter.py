@@ -0,0 +1,125 @@
+"""
+Filtro de Bloom de los emails registrados.
+
+El registro confía en el índice único de ``users.email``: inserta y convierte
+el ``IntegrityError`` en 409. El problema de hacerlo a ciegas es que un email
+repetido paga el hash bcrypt antes de fallar. El filtro responde en memoria
+"seguro que no existe" o "puede existir":
+
+* No existe: se hashea e inserta directamente (una sola consulta).
+* Puede existir: se confirma con un ``SELECT`` antes de hashear.
+
+Un falso positivo solo cuesta esa consulta extra; un falso negativo (p. ej. un
+email registrado por otro worker) lo detecta el índice único igualmente, así
+que el filtro nunca decide por sí solo el resultado.
+"""
+import hashlib
+import math
+from typing import Any, Dict, Iterable
+
+from utils.config import settings
+
+
+class BloomFilter:
+    """Filtro de Bloom sobre un bytearray con doble hashing"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class EmailFilter:
+    """Filtro de emails del proceso; hasta cargarlo responde siempre 'puede existir'"""
+
+    def __init__(self, capacity: int, error_rate: float, enabled: bool = True):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.enabled = enabled
+        self._filter = None
+        self.skipped_checks = 0
+        self.prechecks = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._filter is not None
+
+    def _new_bloom(self, expected: int) -> BloomFilter:
+        """Filtro vacío; dimensiona con margen si ya hay más emails que capacidad"""
+        return BloomFilter(max(self.capacity, 2 * expected), self.error_rate)
+
+    def load(self, emails: Iterable[str], expected: int = 0):
+        """Reconstruye el filtro sin materializar ``emails`` (``expected``: cuántos hay)"""
+        bloom = self._new_bloom(expected)
+        for email in emails:
+            bloom.add(email)
+        self._filter = bloom
+
+    async def reload(self, db):
+        """
+        Carga los emails existentes desde la base de datos. Se cuentan primero
+        para dimensionar el filtro y luego se añaden según llegan del cursor,
+        sin acumularlos en memoria.
+        """
+        from sqlalchemy import func, select
+        from models import User
+
+        if not self.enabled:
+            return
+        bloom = self._new_bloom(await db.scalar(select(func.count()).select_from(User)) or 0)
+        async for email in await db.stream_scalars(select(User.email).execution_options(yield_per=5000)):
+            bloom.add(email)
+        self._filter = bloom
+        print(f"Filtro de emails cargado: {bloom.count} emails, {bloom.size // 8 // 1024} KB")
+
+    def might_exist(self, email: str) -> bool:
+        if self._filter is None:
+            self.prechecks += 1
+            return True
+        if email in self._filter:
+            self.prechecks += 1
+            return True
+        self.skipped_checks += 1
+        return False
+
+    def add(self, email: str):
+        if self._filter is not None:
+            self._filter.add(email)
+
+    def stats(self) -> Dict[str, Any]:
+        if self._filter is None:
+            return {"enabled": self.enabled, "ready": False}
+        return {
+            "enabled": self.enabled,
+            "ready": True,
+            "emails": self._filter.count,
+            "capacity": self._filter.capacity,
+            "size_kb": self._filter.size // 8 // 1024,
+            "hashes": self._filter.hashes,
+            "prechecks": self.prechecks,
+            "skipped_checks": self.skipped_checks,
+        }
+
+
+email_filter = EmailFilter(
+    capacity=settings.EMAIL_FILTER_CAPACITY,
+    error_rate=settings.EMAIL_FILTER_ERROR_RATE,
+    enabled=settings.EMAIL_FILTER_ENABLED,
+)
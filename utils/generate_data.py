@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Generador determinista de datos sintéticos para pruebas de volumen.
+
+Crea usuarios, habitaciones, reservas y notificaciones (millones de filas si
+hace falta) con distribuciones configurables:
+
+- mezcla de capacidades de habitación (``--capacity-mix 1:20,2:50,4:30``);
+- estacionalidad de las reservas: la separación entre estancias de una
+  habitación se acorta en temporada alta (``--seasonality``, ``--peak-day``);
+- reparto sesgado de reservas y notificaciones entre usuarios: unos pocos
+  acumulan muchas (``--user-skew``);
+- bandeja de notificaciones con una proporción de no leídas y un backlog de
+  envíos pendientes para el worker del outbox.
+
+Con la misma ``--seed`` y los mismos parámetros se generan exactamente las
+mismas filas (salvo el hash de la contraseña, que lleva sal aleatoria). Cada tabla usa su propio generador aleatorio, así que cambiar
+p. ej. ``--bookings`` no altera los usuarios. Las reservas activas de una
+habitación nunca se solapan (la restricción de exclusión de PostgreSQL las
+rechazaría).
+
+La carga se hace por bloques de ``--chunk-size`` filas: ``COPY ... FROM
+STDIN`` en PostgreSQL y ``executemany`` en SQLite. Todos los usuarios
+comparten el hash de ``--password`` (hashear millones de contraseñas con
+bcrypt llevaría días). Los contadores de no leídas se calculan al generar
+las notificaciones y se guardan en ``notification_counters``.
+
+Uso:
+    python utils/generate_data.py --users 100000 --rooms 500 --bookings 1000000 --notifications 2000000
+    python utils/generate_data.py --database-url postgresql://u:p@localhost/bench --seed 42 --truncate
+"""
+
+import argparse
+import csv
+import io
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+if __name__ == "__main__":
+    parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, parent_dir)
+
+    # --database-url debe aplicarse antes de importar database
+    for i, arg in enumerate(sys.argv):
+        if arg == "--database-url" and i + 1 < len(sys.argv):
+            os.environ["DATABASE_URL"] = sys.argv[i + 1]
+        elif arg.startswith("--database-url="):
+            os.environ["DATABASE_URL"] = arg.split("=", 1)[1]
+
+from sqlalchemy import delete, func, insert, select, text
+
+from database import engine, init_db
+from models import User, RoomDB, BookingDB, NotificationDB, NotificationCounterDB, adjust_unread_counters
+from utils.passwords import hash_password
+
+ROOM_FEATURES = ["wifi", "tv", "aire", "minibar", "balcon", "vista_mar", "jacuzzi", "escritorio", "cuna"]
+NOMBRES = ["Ana", "Luis", "María", "Carlos", "Lucía", "Javier", "Sofía", "Diego", "Elena", "Pablo", "Marta", "Jorge"]
+APELLIDOS = ["García", "López", "Martínez", "Sánchez", "Pérez", "Gómez", "Ruiz", "Díaz", "Moreno", "Álvarez"]
+CALLES = ["Mayor", "Sol", "Luna", "Prado", "Alameda", "Río", "Olivo", "Castillo"]
+MENSAJES = [
+    "Reserva registrada: habitación {room} del {desde} al {hasta}.",
+    "Recordatorio: tu estancia en la habitación {room} empieza el {desde}.",
+    "Tu reserva de la habitación {room} ha sido cancelada.",
+    "Gracias por alojarte con nosotros. ¡Esperamos verte pronto!",
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generar datos sintéticos para pruebas de volumen")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--rooms", type=int, default=200)
+    parser.add_argument("--bookings", type=int, default=100000)
+    parser.add_argument("--notifications", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Filas por bloque de carga")
+    parser.add_argument("--database-url", default=None, help="Base de datos destino (por defecto DATABASE_URL)")
+    parser.add_argument("--truncate", action="store_true",
+                        help="Vaciar antes usuarios (salvo admins), habitaciones, reservas y notificaciones")
+    parser.add_argument("--password", default="password123", help="Contraseña común de los usuarios generados")
+    parser.add_argument("--email-domain", default="example.com")
+    parser.add_argument("--start-date", default="2025-01-01", help="Inicio del periodo de reservas (YYYY-MM-DD)")
+    parser.add_argument("--days", type=int, default=730, help="Días del periodo de reservas")
+    parser.add_argument("--capacity-mix", default="1:15,2:50,3:15,4:15,6:5",
+                        help="capacidad:peso separados por comas")
+    parser.add_argument("--seasonality", type=float, default=0.5,
+                        help="Amplitud de la estacionalidad (0 = uniforme, <1)")
+    parser.add_argument("--peak-day", type=int, default=196, help="Día del año de máxima ocupación")
+    parser.add_argument("--max-nights", type=int, default=7)
+    parser.add_argument("--cancel-ratio", type=float, default=0.08, help="Proporción de reservas canceladas")
+    parser.add_argument("--user-skew", type=float, default=2.0,
+                        help="Sesgo del reparto entre usuarios (1 = uniforme)")
+    parser.add_argument("--unread-ratio", type=float, default=0.3, help="Proporción de notificaciones no leídas")
+    parser.add_argument("--pending-ratio", type=float, default=0.02,
+                        help="Proporción de notificaciones pendientes de envío (backlog del outbox)")
+    return parser.parse_args()
+
+
+def parse_capacity_mix(value: str) -> Tuple[List[int], List[float]]:
+    capacities, weights = [], []
+    for part in value.split(","):
+        capacity, weight = part.split(":")
+        capacities.append(int(capacity))
+        weights.append(float(weight))
+    if not capacities or min(capacities) < 1:
+        raise ValueError("Las capacidades deben ser enteros >= 1")
+    return capacities, weights
+
+
+def chunked(rows: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def skewed_index(rng: random.Random, count: int, skew: float) -> int:
+    """Índice en [0, count) con más peso en los primeros cuanto mayor es ``skew``"""
+    return min(count - 1, int(count * rng.random() ** skew))
+
+
+def season_factor(day: datetime, amplitude: float, peak_day: int) -> float:
+    """Ocupación relativa del día (1 +- amplitud, máxima en ``peak_day``)"""
+    phase = 2 * math.pi * (day.timetuple().tm_yday - peak_day) / 365.25
+    return 1 + amplitude * math.cos(phase)
+
+
+# Generadores de filas (ids explícitos para enlazar las tablas sin leerlas)
+
+def generate_users(args, first_id: int, password_hash: str) -> Iterator[dict]:
+    rng = random.Random(f"{args.seed}:users")
+    start = datetime.fromisoformat(args.start_date)
+    for i in range(args.users):
+        user_id = first_id + i
+        yield {
+            "id": user_id,
+            "email": f"user{user_id}@{args.email_domain}",
+            "password_hash": password_hash,
+            "nombre_completo": rng.choice(NOMBRES),
+            "apellidos": f"{rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}",
+            "direccion": f"Calle {rng.choice(CALLES)} {rng.randint(1, 200)}",
+            "edad": int(rng.triangular(18, 85, 35)),
+            "telefono": f"{rng.randint(6, 9)}{rng.randint(0, 10 ** 9 - 1):09d}",
+            "role": "clientes",
+            "is_authorized": True,
+            "created_at": start - timedelta(seconds=rng.randint(0, 3 * 365 * 86400)),
+        }
+
+
+def generate_rooms(args, first_id: int) -> Iterator[dict]:
+    rng = random.Random(f"{args.seed}:rooms")
+    capacities, weights = parse_capacity_mix(args.capacity_mix)
+    for i in range(args.rooms):
+        room_id = first_id + i
+        yield {
+            "Id": room_id,
+            "Estado": "Disponible",
+            "Capacidad": rng.choices(capacities, weights)[0],
+            "Caracteristicas": sorted(rng.sample(ROOM_FEATURES, rng.randint(1, 5))),
+            "Ubicacion": f"Planta {room_id % 20 + 1}, habitación {room_id}",
+        }
+
+
+def generate_bookings(args, first_id: int, room_ids: range, user_ids: range) -> Iterator[dict]:
+    """
+    Recorre cada habitación en el tiempo encadenando estancias: la separación
+    media se ajusta para repartir las reservas en ``--days`` y se divide por
+    el factor de temporada, así que en temporada alta las estancias se juntan.
+    """
+    rng = random.Random(f"{args.seed}:bookings")
+    start = datetime.fromisoformat(args.start_date)
+    per_room, extra = divmod(args.bookings, len(room_ids)) if room_ids else (0, 0)
+    mean_nights = (1 + args.max_nights) / 2
+    booking_id = first_id
+    for index, room_id in enumerate(room_ids):
+        count = per_room + (1 if index < extra else 0)
+        if not count:
+            continue
+        mean_gap = max(0.0, args.days / count - mean_nights)
+        cursor = start + timedelta(hours=rng.randint(0, 48))
+        for _ in range(count):
+            factor = season_factor(cursor, args.seasonality, args.peak_day)
+            gap = rng.expovariate(factor / mean_gap) if mean_gap else 0.0
+            desde = (cursor + timedelta(days=gap)).replace(hour=15, minute=0, second=0, microsecond=0)
+            if desde < cursor:
+                desde += timedelta(days=1)
+            hasta = (desde + timedelta(days=rng.randint(1, args.max_nights))).replace(hour=12)
+            cancelled = rng.random() < args.cancel_ratio
+            yield {
+                "Id": booking_id,
+                "Room_Id": room_id,
+                "User_Id": user_ids[skewed_index(rng, len(user_ids), args.user_skew)],
+                "Estado": "Cancelada" if cancelled else "Pendiente",
+                "BookingIn": desde,
+                "BookingOn": hasta,
+                "created_at": desde - timedelta(days=rng.randint(1, 90), seconds=rng.randint(0, 86399)),
+            }
+            booking_id += 1
+            # Una cancelada deja la habitación libre para la siguiente estancia
+            cursor = desde if cancelled else hasta
+
+
+def generate_notifications(args, first_id: int, user_ids: range, unread: Dict[int, int]) -> Iterator[dict]:
+    rng = random.Random(f"{args.seed}:notifications")
+    start = datetime.fromisoformat(args.start_date)
+    span = args.days * 86400
+    for i in range(args.notifications):
+        user_id = user_ids[skewed_index(rng, len(user_ids), args.user_skew)]
+        created_at = start + timedelta(seconds=rng.randint(0, span))
+        desde = created_at + timedelta(days=rng.randint(1, 60))
+        mensaje = rng.choice(MENSAJES).format(
+            room=rng.randint(1, max(args.rooms, 1)),
+            desde=desde.strftime("%Y-%m-%d %H:%M"),
+            hasta=(desde + timedelta(days=rng.randint(1, args.max_nights))).strftime("%Y-%m-%d %H:%M"),
+        )
+        roll = rng.random()
+        pending = roll < args.pending_ratio
+        leida = not pending and roll >= args.pending_ratio + args.unread_ratio
+        if not leida:
+            unread[user_id] = unread.get(user_id, 0) + 1
+        yield {
+            "Id": first_id + i,
+            "User_id": user_id,
+            "Mensaje": mensaje,
+            "Estado": leida,
+            "created_at": created_at,
+            "enviada_en": None if pending else created_at + timedelta(seconds=rng.randint(1, 30)),
+            "proximo_intento": created_at,
+            "intentos": 0 if pending else 1,
+            "ultimo_error": None,
+        }
+
+
+# Carga
+
+def _copy_value(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def load_rows(table, rows: Iterable[dict], chunk_size: int) -> int:
+    """Inserta por bloques con COPY (PostgreSQL) o executemany (resto); devuelve las filas"""
+    started = time.perf_counter()
+    loaded = 0
+    use_copy = engine.dialect.name == "postgresql"
+    columns = [column.name for column in table.columns]
+    copy_sql = 'COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+        table.name, ", ".join(f'"{name}"' for name in columns))
+
+    for chunk in chunked(rows, chunk_size):
+        if use_copy:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in chunk:
+                # En CSV un campo vacío sin comillas es NULL
+                writer.writerow([_copy_value(row.get(name)) for name in columns])
+            buffer.seek(0)
+            connection = engine.raw_connection()
+            try:
+                with connection.cursor() as cursor:
+                    cursor.copy_expert(copy_sql, buffer)
+                connection.commit()
+            finally:
+                connection.close()
+        else:
+            with engine.begin() as conn:
+                if engine.dialect.name == "sqlite":
+                    # Carga masiva: sin fsync al confirmar cada bloque
+                    conn.exec_driver_sql("PRAGMA synchronous = OFF")
+                conn.execute(insert(table), chunk)
+        loaded += len(chunk)
+        elapsed = time.perf_counter() - started
+        print(f"   ... {table.name}: {loaded:,} filas ({loaded / elapsed:,.0f} filas/s)", end="\r")
+
+    elapsed = time.perf_counter() - started
+    rate = loaded / elapsed if elapsed else 0
+    print(f"   {table.name}: {loaded:,} filas en {elapsed:.1f} s ({rate:,.0f} filas/s)" + " " * 10)
+    return loaded
+
+
+def next_id(column) -> int:
+    with engine.connect() as conn:
+        return (conn.execute(select(func.max(column))).scalar() or 0) + 1
+
+
+def reset_sequences():
+    """Con ids explícitos, las secuencias de PostgreSQL deben avanzar hasta el máximo"""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        for table, column in (("users", "id"), ("rooms", "Id"), ("bookings", "Id"), ("notifications", "Id")):
+            conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', '\"{column}\"'), "
+                f"COALESCE((SELECT MAX(\"{column}\") FROM {table}), 0) + 1, false)"
+            ))
+
+
+def truncate():
+    with engine.begin() as conn:
+        conn.execute(delete(NotificationCounterDB))
+        conn.execute(delete(NotificationDB))
+        conn.execute(delete(BookingDB))
+        conn.execute(delete(RoomDB))
+        conn.execute(delete(User).where(User.role != "admin"))
+
+
+def main():
+    args = parse_args()
+    if not 0 <= args.seasonality < 1:
+        print("❌ --seasonality debe estar en [0, 1).")
+        sys.exit(1)
+    if args.users < 1 and (args.bookings or args.notifications):
+        print("❌ Las reservas y notificaciones necesitan al menos un usuario.")
+        sys.exit(1)
+    if args.bookings and args.rooms < 1:
+        print("❌ Las reservas necesitan al menos una habitación.")
+        sys.exit(1)
+
+    # Sin hueco entre estancias la estacionalidad no tiene efecto y las
+    # reservas se extienden más allá del periodo
+    room_nights = args.rooms * args.days / ((1 + args.max_nights) / 2)
+    if args.bookings > 0.8 * room_nights:
+        print(f"⚠️  {args.bookings:,} reservas saturan {args.rooms} habitaciones en {args.days} días "
+              f"(caben ~{room_nights:,.0f}): el periodo se alargará y la estacionalidad apenas se notará. "
+              "Aumenta --rooms o --days.")
+
+    init_db()
+    print(f"🚀 Generando datos en {engine.url.render_as_string(hide_password=True)} (seed {args.seed})")
+    if args.truncate:
+        print("   Vaciando tablas...")
+        truncate()
+
+    started = time.perf_counter()
+    first_user = next_id(User.id)
+    first_room = next_id(RoomDB.Id)
+    user_ids = range(first_user, first_user + args.users)
+    room_ids = range(first_room, first_room + args.rooms)
+
+    load_rows(User.__table__, generate_users(args, first_user, hash_password(args.password)), args.chunk_size)
+    load_rows(RoomDB.__table__, generate_rooms(args, first_room), args.chunk_size)
+    load_rows(BookingDB.__table__, generate_bookings(args, next_id(BookingDB.Id), room_ids, user_ids),
+              args.chunk_size)
+
+    unread: Dict[int, int] = {}
+    load_rows(NotificationDB.__table__, generate_notifications(args, next_id(NotificationDB.Id), user_ids, unread),
+              args.chunk_size)
+    with engine.begin() as conn:
+        for chunk in chunked(unread.items(), args.chunk_size):
+            adjust_unread_counters(conn, dict(chunk))
+    reset_sequences()
+
+    elapsed = time.perf_counter() - started
+    print("✅ Generación terminada")
+    print(f"   Tiempo total: {elapsed:.1f} s")
+    print(f"   Contraseña de los usuarios generados: {args.password}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Servicio de hashing de contraseñas fuera del event loop.
+
+bcrypt tarda cientos de milisegundos por operación; ejecutarlo dentro de un
+handler ``async def`` congela todo el servidor. Este módulo ejecuta el hashing
+en un pool de hilos acotado (bcrypt libera el GIL) y rechaza trabajo nuevo
+cuando la cola está llena para que las rutas respondan 503 en lugar de
+acumular latencia.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from utils.config import settings
+from utils.metrics import record_hash
+
+
+class HashingOverloadedError(Exception):
+    """La cola de hashing está llena y la petición debe rechazarse"""
+
+
+class _TimingStats:
+    """Acumulador simple de tiempos (conteo, total y máximo en segundos)"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def as_dict(self) -> Dict[str, float]:
+        avg = self.total / self.count if self.count else 0.0
+        return {
+            "count": self.count,
+            "avg_ms": round(avg * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+            "total_s": round(self.total, 6),
+        }
+
+
+class PasswordHasher:
+    """Pool de hilos acotado para operaciones de hashing de contraseñas"""
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._rejected = 0
+        self._queue_wait = _TimingStats()
+        self._hash_time = _TimingStats()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        # Crear el pool de forma perezosa para no lanzar hilos al importar
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="password-hasher",
+                    )
+        return self._executor
+
+    @property
+    def queue_depth(self) -> int:
+        """Trabajos esperando un hilo libre (sin contar los que ya se ejecutan)"""
+        return max(0, self._in_flight - self.max_workers)
+
+    def _acquire_slot(self):
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise HashingOverloadedError("Cola de hashing llena")
+            self._in_flight += 1
+
+    def _release_slot(self, _future=None):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _submit(self, fn: Callable, args: tuple):
+        """
+        Encola el trabajo en el pool ocupando un hueco. El hueco se libera
+        cuando el trabajo termina (o se cancela sin haber empezado), no cuando
+        deja de esperarlo quien lo pidió: si la petición se cancela, el hash
+        sigue ocupando un hilo y debe seguir contando para el límite de la cola.
+        """
+        self._acquire_slot()
+        try:
+            future = self.executor.submit(self._timed, fn, args, time.perf_counter())
+        except BaseException:
+            self._release_slot()
+            raise
+        future.add_done_callback(self._release_slot)
+        return future
+
+    def _timed(self, fn: Callable, args: tuple, submitted_at: float):
+        """Ejecuta en un hilo del pool; devuelve (resultado, espera, duración)"""
+        started_at = time.perf_counter()
+        try:
+            result = fn(*args)
+        finally:
+            finished_at = time.perf_counter()
+            with self._lock:
+                self._queue_wait.add(started_at - submitted_at)
+                self._hash_time.add(finished_at - started_at)
+        return result, started_at - submitted_at, finished_at - started_at
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Ejecuta ``fn(*args)`` en el pool sin bloquear el event loop"""
+        result, waited, elapsed = await asyncio.wrap_future(self._submit(fn, args))
+        # Se registra aquí, en el contexto de la petición (el hilo no lo hereda)
+        record_hash(elapsed, waited)
+        return result
+
+    def run_sync(self, fn: Callable, *args) -> Any:
+        """Variante bloqueante para scripts de línea de comandos"""
+        return self._submit(fn, args).result()[0]
+
+    async def set_password(self, user, raw_password: str):
+        """Calcula el hash de la contraseña del usuario en el pool"""
+        await self.run(user.set_password, raw_password)
+
+    async def check_password(self, user, raw_password: str) -> bool:
+        """Verifica la contraseña del usuario en el pool"""
+        return await self.run(user.check_password, raw_password)
+
+    async def verify_and_update(self, user, raw_password: str):
+        """Verifica y, si hace falta, recalcula el hash en el pool: (válida, rehasheado)"""
+        return await self.run(user.verify_and_update, raw_password)
+
+    def stats(self) -> Dict[str, Any]:
+        """Métricas de cola y de tiempo de hashing"""
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "queue_depth": self.queue_depth,
+                "rejected": self._rejected,
+                "queue_wait": self._queue_wait.as_dict(),
+                "hash_time": self._hash_time.as_dict(),
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    max_workers=settings.HASHING_WORKERS or min(4, os.cpu_count() or 1),
+    max_queue=settings.HASHING_MAX_QUEUE,
+)
@@ -0,0 +1,179 @@
+"""
+Filtrado de peticiones por IP y comprobación de orígenes CORS.
+
+``CIDRMatcher`` compila una lista de CIDRs en intervalos [inicio, fin] de
+enteros, fusiona los solapados y los ordena: comprobar una IP es convertirla
+a entero y hacer una búsqueda binaria (O(log n)) en lugar de recorrer la lista
+de redes con ``ipaddress``.
+
+``IPFilterMiddleware`` es un middleware ASGI puro (sin ``BaseHTTPMiddleware``)
+que resuelve la IP real del cliente (``X-Forwarded-For`` solo si la conexión
+viene de un proxy de ``TRUSTED_PROXIES``), la deja en ``scope["client"]`` para
+el resto de la aplicación y aplica la lista de denegados y, en modo
+``allowlist``, la de ``ALLOWED_CIDRS``.
+
+``SetCORSMiddleware`` es el CORS de Starlette con los orígenes en un
+``frozenset``: la comprobación del origen pasa de recorrer la lista a un
+acceso por hash.
+"""
+import ipaddress
+import json
+import socket
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+from starlette.middleware.cors import CORSMiddleware
+
+from utils.config import settings
+
+
+@lru_cache(maxsize=65536)
+def ip_to_int(ip: str) -> Optional[Tuple[int, int]]:
+    """(versión, entero) de una IP en texto; None si no es una IP válida"""
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), 'big')
+    except OSError:
+        pass
+    try:
+        return 6, int.from_bytes(socket.inet_pton(socket.AF_INET6, ip.split('%', 1)[0]), 'big')
+    except (OSError, ValueError):
+        return None
+
+
+class CIDRMatcher:
+    """Conjunto de CIDRs compilado a intervalos ordenados por versión de IP"""
+
+    def __init__(self, cidrs: Iterable[str]):
+        intervals = {4: [], 6: []}
+        for cidr in cidrs:
+            network = ipaddress.ip_network(cidr.strip(), strict=False)
+            intervals[network.version].append(
+                (int(network.network_address), int(network.broadcast_address))
+            )
+        self._starts = {}
+        self._ends = {}
+        for version, ranges in intervals.items():
+            merged: List[List[int]] = []
+            for start, end in sorted(ranges):
+                if merged and start <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+            self._starts[version] = [start for start, _ in merged]
+            self._ends[version] = [end for _, end in merged]
+        self.size = sum(len(starts) for starts in self._starts.values())
+
+    def __bool__(self) -> bool:
+        return self.size > 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def contains_int(self, version: int, value: int) -> bool:
+        starts = self._starts[version]
+        i = bisect_right(starts, value) - 1
+        return i >= 0 and value <= self._ends[version][i]
+
+    def __contains__(self, ip: str) -> bool:
+        parsed = ip_to_int(ip)
+        return parsed is not None and self.contains_int(*parsed)
+
+
+def resolve_client_ip(peer: str, forwarded_for: Optional[str], trusted_proxies: CIDRMatcher) -> str:
+    """
+    IP real del cliente. ``X-Forwarded-For`` solo se tiene en cuenta si la
+    conexión viene de un proxy de confianza, y se recorre de derecha a
+    izquierda saltando los proxies de confianza (lo de la izquierda lo escribe
+    el cliente y puede ser falso).
+    """
+    if not forwarded_for or not trusted_proxies or peer not in trusted_proxies:
+        return peer
+    hops = [hop.strip() for hop in forwarded_for.split(',')]
+    for hop in reversed(hops):
+        if hop and hop not in trusted_proxies:
+            return hop
+    return hops[0] or peer
+
+
+class IPFilterMiddleware:
+    """Middleware ASGI de resolución de IP y filtrado allow/deny"""
+
+    def __init__(
+        self,
+        app,
+        allowed: Iterable[str] = (),
+        denied: Iterable[str] = (),
+        trusted_proxies: Iterable[str] = (),
+        mode: str = "off",
+        paths: Iterable[str] = (),
+    ):
+        self.app = app
+        self.allowed = CIDRMatcher(allowed)
+        self.denied = CIDRMatcher(denied)
+        self.trusted_proxies = CIDRMatcher(trusted_proxies)
+        self.enforce_allowlist = mode == "allowlist"
+        self.paths = tuple(paths)
+        self.active = bool(self.denied) or self.enforce_allowlist
+        self.behind_proxy = bool(self.trusted_proxies)
+        # Las listas no cambian en caliente: la IP resuelta por cabecera y el
+        # veredicto por IP se memorizan
+        self.is_blocked = lru_cache(maxsize=65536)(self._is_blocked)
+        self.resolve = lru_cache(maxsize=65536)(self._resolve)
+
+    def _resolve(self, peer: str, forwarded_for: bytes) -> str:
+        return resolve_client_ip(peer, forwarded_for.decode("latin-1"), self.trusted_proxies)
+
+    def _is_blocked(self, ip: str) -> bool:
+        parsed = ip_to_int(ip)
+        if parsed is None:
+            # Sin IP reconocible (p. ej. socket Unix) solo bloquea el modo allowlist
+            return self.enforce_allowlist
+        if self.denied and self.denied.contains_int(*parsed):
+            return True
+        return self.enforce_allowlist and not self.allowed.contains_int(*parsed)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+
+        client = scope.get("client")
+        if client and self.behind_proxy:
+            for name, value in scope["headers"]:
+                if name == b"x-forwarded-for":
+                    ip = self.resolve(client[0], value)
+                    if ip != client[0]:
+                        client = scope["client"] = (ip, client[1])
+                    break
+
+        if (
+            self.active
+            and (not self.paths or scope["path"].startswith(self.paths))
+            and self.is_blocked(client[0] if client else "")
+        ):
+            return await self._forbidden(scope, receive, send)
+        return await self.app(scope, receive, send)
+
+    async def _forbidden(self, scope, receive, send):
+        if scope["type"] == "websocket":
+            await send({"type": "websocket.close", "code": 1008})
+            return
+        body = json.dumps({"detail": "Acceso no permitido desde esta dirección IP."}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 403,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+class SetCORSMiddleware(CORSMiddleware):
+    """CORSMiddleware con búsqueda del origen en un frozenset"""
+
+    def __init__(self, app, **kwargs):
+        super().__init__(app, **kwargs)
+        self.allow_origins = frozenset(self.allow_origins)
+
+
+# Matchers compartidos con el resto de la aplicación (p. ej. el límite de login)
+allowed_networks = CIDRMatcher(settings.ALLOWED_CIDRS)
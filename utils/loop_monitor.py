@@ -0,0 +1,156 @@
+"""
+Vigilancia del retardo del event loop.
+
+Una tarea duerme ``LOOP_MONITOR_INTERVAL`` segundos en bucle y mide cuánto
+tarda de más en despertar: ese retraso es el tiempo que el loop estuvo
+ocupado sin ceder (código síncrono dentro de un ``async def``: SQLAlchemy
+síncrono, bcrypt, ``email_validator``...). Se exporta como histograma en
+``/metrics`` y cada retraso por encima de ``LOOP_LAG_THRESHOLD_MS`` cuenta
+como bloqueo.
+
+Con ``LOOP_MONITOR_DEBUG`` un hilo aparte comprueba el latido de esa tarea:
+si el loop lleva más del umbral sin responder, captura la pila del hilo del
+loop en ese instante (el código que lo bloquea) y la ruta de la petición en
+curso, que se obtiene subiendo por los frames hasta el ``scope`` ASGI. Al
+terminar el bloqueo se imprime la duración, la ruta y la pila. La captura usa
+``sys._current_frames`` y tiene un coste pequeño pero no nulo: es un modo de
+diagnóstico.
+"""
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Dict, Optional, Tuple
+
+from utils.config import settings
+from utils.metrics import metrics
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+loop_lag = metrics.histogram(
+    "event_loop_lag_seconds", "Retraso del event loop al despertar la tarea de vigilancia",
+    buckets=LAG_BUCKETS)
+loop_stalls = metrics.histogram(
+    "event_loop_stall_seconds", "Bloqueos del event loop por encima del umbral, por ruta",
+    ("route",), LAG_BUCKETS)
+
+
+def _route_of(frame) -> Optional[str]:
+    """Ruta de la petición que se ejecuta en ``frame`` (busca el scope ASGI hacia arriba)"""
+    while frame is not None:
+        # f_locals solo en los frames que declaran ``scope`` (middlewares y apps ASGI)
+        scope = frame.f_locals.get("scope") if "scope" in frame.f_code.co_varnames else None
+        if isinstance(scope, dict) and scope.get("type") in ("http", "websocket"):
+            route = scope.get("route")
+            return getattr(route, "path", None) or scope.get("path")
+        frame = frame.f_back
+    return None
+
+
+class LoopLagMonitor:
+    """Tarea de medición del retardo y, en modo depuración, hilo de captura"""
+
+    def __init__(self, interval: float, threshold: float, debug: bool = False, stack_limit: int = 25):
+        self.interval = interval
+        self.threshold = threshold
+        self.debug = debug
+        self.stack_limit = stack_limit
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat = 0.0
+        # Captura del bloqueo en curso: (latido en que se detectó, ruta, pila)
+        self._capture: Optional[Tuple[float, Optional[str], str]] = None
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.stalls_by_route: Dict[str, int] = {}
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.perf_counter()
+        self._stopping.clear()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        if self.debug:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self):
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    async def _run(self):
+        while True:
+            beat = self._heartbeat
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self._heartbeat = now
+            self._record(max(0.0, now - beat - self.interval), beat)
+
+    def _record(self, lag: float, beat: float):
+        loop_lag.observe(lag)
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        if lag < self.threshold:
+            return
+        self.stalls += 1
+        capture, self._capture = self._capture, None
+        route, stack = (capture[1], capture[2]) if capture and capture[0] == beat else (None, None)
+        label = route or "desconocida"
+        self.stalls_by_route[label] = self.stalls_by_route.get(label, 0) + 1
+        loop_stalls.observe(lag, label)
+        if self.debug:
+            print(f"⚠️  Event loop bloqueado {lag * 1000:.0f} ms (ruta: {label})")
+            if stack:
+                print(stack, end="")
+
+    def _watch(self):
+        """Hilo de depuración: captura la pila del loop mientras está bloqueado"""
+        poll = max(0.005, self.threshold / 4)
+        while not self._stopping.wait(poll):
+            beat = self._heartbeat
+            blocked_for = time.perf_counter() - beat - self.interval
+            if blocked_for < self.threshold or (self._capture and self._capture[0] == beat):
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            # El último latido identifica la espera que se está retrasando
+            stack = "".join(traceback.format_stack(frame, limit=self.stack_limit))
+            self._capture = (beat, _route_of(frame), stack)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None,
+            "debug": self.debug,
+            "threshold_ms": round(self.threshold * 1000, 1),
+            "last_lag_ms": round(self.last_lag * 1000, 3),
+            "max_lag_ms": round(self.max_lag * 1000, 3),
+            "stalls": self.stalls,
+            "stalls_by_route": dict(self.stalls_by_route),
+        }
+
+
+loop_monitor = LoopLagMonitor(
+    interval=settings.LOOP_MONITOR_INTERVAL,
+    threshold=settings.LOOP_LAG_THRESHOLD_MS / 1000,
+    debug=settings.LOOP_MONITOR_DEBUG,
+)
+
+metrics.gauge("event_loop_lag_max_seconds", "Mayor retraso del event loop desde el arranque",
+              lambda: loop_monitor.max_lag)
+metrics.gauge("event_loop_stalls", "Bloqueos del event loop por encima del umbral",
+              lambda: loop_monitor.stalls)
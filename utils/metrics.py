@@ -0,0 +1,260 @@
+"""
+Métricas de latencia en formato de texto de Prometheus.
+
+``MetricsMiddleware`` (ASGI puro) mide cada petición HTTP y la etiqueta con la
+plantilla de la ruta (``/rooms/{room_id}``, no la URL concreta, para acotar el
+número de series), el método y el código de estado. Durante la petición un
+``RequestTimings`` en un ``ContextVar`` acumula lo que ocurre dentro:
+
+- consultas SQL: número y tiempo, con eventos ``before/after_cursor_execute``
+  en los engines de ``database.py`` (``instrument_engine``);
+- hashing de contraseñas: tiempo en el pool de ``utils.hashing`` y espera en
+  su cola;
+- verificación de JWT: ``jwt.decode`` en ``utils.auth.decode_token`` (los
+  aciertos de la caché de tokens no cuentan).
+
+Todo se agrega en histogramas de proceso y se expone en ``GET /metrics``. Con
+``SERVER_TIMING_ENABLED`` la respuesta incluye además la cabecera
+``Server-Timing`` con el desglose de la propia petición, visible en las
+herramientas de desarrollo del navegador.
+
+``/metrics`` no requiere autenticación: en producción conviene limitarlo a la
+red interna (p. ej. con ``IP_FILTER_PATHS``).
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+
+# Segundos; cubren desde una consulta por índice hasta un bcrypt lento
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Histograma con buckets fijos y una serie por combinación de etiquetas"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # etiquetas -> [conteo por bucket (no acumulado)..., +Inf, suma]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_number(bound)
+                bucket_labels = _format_labels(self.labelnames, labels, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {series[-1]!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Valor leído en el momento de la consulta a /metrics"""
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def render(self) -> List[str]:
+        try:
+            value = self.read()
+        except Exception as e:
+            print(f"Error al leer la métrica {self.name}: {e}")
+            return []
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge",
+                f"{self.name} {_format_number(value)}"]
+
+
+class MetricsRegistry:
+    """Conjunto de métricas del proceso"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, read: Callable[[], float]) -> Gauge:
+        self._metrics[name] = Gauge(name, documentation, read)
+        return self._metrics[name]
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+request_latency = metrics.histogram(
+    "http_request_duration_seconds", "Latencia de las peticiones HTTP por ruta",
+    ("method", "route", "status"))
+request_db_queries = metrics.histogram(
+    "http_request_db_queries", "Consultas SQL por petición HTTP", ("route",), QUERY_COUNT_BUCKETS)
+request_db_time = metrics.histogram(
+    "http_request_db_seconds", "Tiempo en consultas SQL por petición HTTP", ("route",))
+db_query_time = metrics.histogram(
+    "db_query_duration_seconds", "Duración de cada consulta SQL")
+password_hash_time = metrics.histogram(
+    "password_hash_duration_seconds", "Duración de cada operación de hashing de contraseñas")
+password_hash_wait = metrics.histogram(
+    "password_hash_queue_wait_seconds", "Espera en la cola del pool de hashing")
+jwt_decode_time = metrics.histogram(
+    "jwt_decode_duration_seconds", "Verificación de firma de JWT (fallos de la caché de tokens)")
+
+
+class RequestTimings:
+    """Tiempos acumulados durante una petición"""
+
+    __slots__ = ("db_queries", "db_seconds", "hash_seconds", "jwt_seconds")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.hash_seconds = 0.0
+        self.jwt_seconds = 0.0
+
+
+_current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current_timings.get()
+
+
+def record_hash(seconds: float, queue_wait: float = 0.0):
+    password_hash_time.observe(seconds)
+    password_hash_wait.observe(queue_wait)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.hash_seconds += seconds
+
+
+def record_jwt(seconds: float):
+    jwt_decode_time.observe(seconds)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.jwt_seconds += seconds
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started_at"].pop()
+    elapsed = time.perf_counter() - started
+    db_query_time.observe(elapsed)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.db_queries += 1
+        timings.db_seconds += elapsed
+
+
+def _handle_error(exception_context):
+    # Una consulta fallida no llega a after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started_at"):
+        connection.info["query_started_at"].pop()
+
+
+def instrument_engine(engine):
+    """Registra los eventos de medición en un engine síncrono (o ``async_engine.sync_engine``)"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def _server_timing(timings: RequestTimings, app_seconds: float) -> bytes:
+    parts = [f"app;dur={app_seconds * 1000:.1f}"]
+    if timings.db_queries:
+        parts.append(f'db;dur={timings.db_seconds * 1000:.1f};desc="{timings.db_queries} SQL"')
+    if timings.hash_seconds:
+        parts.append(f"hash;dur={timings.hash_seconds * 1000:.1f}")
+    if timings.jwt_seconds:
+        parts.append(f"jwt;dur={timings.jwt_seconds * 1000:.2f}")
+    return ", ".join(parts).encode()
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que mide las peticiones HTTP (los WebSockets no se miden)"""
+
+    def __init__(self, app, server_timing: bool = False):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    # El desglose llega hasta el envío de cabeceras (las
+                    # respuestas en streaming siguen después)
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", _server_timing(timings, time.perf_counter() - started)))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current_timings.reset(token)
+            route = scope.get("route")
+            # Sin ruta (404) se agrupan en una sola serie
+            path = getattr(route, "path", None) or "unmatched"
+            request_latency.observe(elapsed, scope["method"], path, str(status))
+            request_db_queries.observe(timings.db_queries, path)
+            request_db_time.observe(timings.db_seconds, path)
@@ -0,0 +1,93 @@
+"""
+Pub/sub en proceso para enviar notificaciones en tiempo real.
+
+Cada conexión WebSocket/SSE abierta se registra como una ``Subscription`` del
+usuario. Al publicar, el mensaje se serializa una sola vez y se deja en el
+buffer acotado de cada conexión del usuario; si un cliente lento llena su
+buffer se descartan los mensajes más antiguos en lugar de acumular memoria.
+Los clientes recuperan lo perdido consultando su bandeja de notificaciones.
+
+El hub vive en el proceso: con varios workers, una notificación solo llega en
+tiempo real si la conexión del usuario está en el mismo worker que la envía;
+en caso contrario queda pendiente en la bandeja.
+"""
+import asyncio
+import json
+from typing import Any, Dict, Set
+
+from utils.config import settings
+
+
+class Subscription:
+    """Conexión de un usuario con su buffer de envío acotado"""
+
+    __slots__ = ("user_id", "queue", "dropped")
+
+    def __init__(self, user_id: int, maxsize: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def offer(self, message: str):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+
+class NotificationHub:
+    """Registro de conexiones por usuario y difusión de mensajes"""
+
+    def __init__(self, buffer_size: int):
+        self.buffer_size = buffer_size
+        self._subscriptions: Dict[int, Set[Subscription]] = {}
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(user_id, self.buffer_size)
+        self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscriptions.get(subscription.user_id)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        self.dropped += subscription.dropped
+        if not subscriptions:
+            del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_id: int, payload: Dict[str, Any]) -> int:
+        """Entrega el mensaje a todas las conexiones del usuario; devuelve cuántas"""
+        subscriptions = self._subscriptions.get(user_id)
+        if not subscriptions:
+            return 0
+        message = json.dumps(payload, default=str)
+        for subscription in subscriptions:
+            subscription.offer(message)
+        self.published += 1
+        return len(subscriptions)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "users": len(self._subscriptions),
+            "connections": sum(len(s) for s in self._subscriptions.values()),
+            "published": self.published,
+            "dropped": self.dropped + sum(
+                sub.dropped for subs in self._subscriptions.values() for sub in subs
+            ),
+        }
+
+
+notification_hub = NotificationHub(buffer_size=settings.NOTIFICATIONS_STREAM_BUFFER)
+
+
+async def hub_sender(notification) -> bool:
+    """Sender del outbox: entregada si el usuario tiene alguna conexión abierta"""
+    return notification_hub.publish(notification.User_id, {
+        "Id": notification.Id,
+        "User_id": notification.User_id,
+        "Mensaje": notification.Mensaje,
+        "created_at": notification.created_at.isoformat(),
+    }) > 0
@@ -0,0 +1,218 @@
+"""
+Outbox de notificaciones.
+
+Las rutas solo insertan la notificación en la tabla ``notifications`` dentro
+de su propia transacción (``enqueue_notification``); el envío lo hace un
+worker en segundo plano que drena las pendientes por lotes, con reintentos y
+backoff exponencial. Así el envío nunca añade latencia a las peticiones de
+reservas o autenticación y una notificación no se pierde si el proceso cae
+antes de enviarla.
+
+Para que varios workers puedan drenar la misma tabla sin duplicar envíos,
+cada lote se "reserva" adelantando ``proximo_intento`` (lease) con un UPDATE
+condicional antes de enviarlo.
+"""
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import NotificationDB, adjust_unread_counters
+from utils.config import settings
+from utils.notification_hub import hub_sender
+
+# Un sender recibe la notificación y devuelve True si llegó al usuario
+NotificationSender = Callable[[NotificationDB], Awaitable[bool]]
+
+
+async def log_sender(notification: NotificationDB) -> bool:
+    """Sender por defecto: solo registra el envío"""
+    print(f"Notificación {notification.Id} para usuario {notification.User_id}: {notification.Mensaje}")
+    return True
+
+
+def enqueue_notification(db: AsyncSession, user_id: int, mensaje: str) -> NotificationDB:
+    """Agrega una notificación pendiente a la transacción actual (sin commit)"""
+    notification = NotificationDB(User_id=user_id, Mensaje=mensaje)
+    db.add(notification)
+    return notification
+
+
+async def set_notifications_state(
+    db: AsyncSession,
+    ids: Iterable[int],
+    estado: bool,
+    user_id: Optional[int] = None,
+) -> Dict[int, int]:
+    """
+    Marca varias notificaciones como entregadas (o pendientes) con un solo
+    UPDATE y ajusta los contadores de no leídas en la misma transacción.
+    Solo se cuentan las filas que cambian de estado; con ``user_id`` se
+    limita a las notificaciones de ese usuario. Devuelve cuántas cambiaron
+    por usuario.
+    """
+    ids = list(ids)
+    if not ids:
+        return {}
+    query = update(NotificationDB).where(NotificationDB.Id.in_(ids), NotificationDB.Estado != estado)
+    if user_id is not None:
+        query = query.where(NotificationDB.User_id == user_id)
+    changed = list(await db.scalars(
+        query.values(Estado=estado)
+        .returning(NotificationDB.User_id)
+        .execution_options(synchronize_session=False)
+    ))
+    changed_by_user = dict(Counter(changed))
+    sign = -1 if estado else 1
+    deltas = {owner: sign * count for owner, count in changed_by_user.items()}
+    if deltas:
+        await db.run_sync(lambda session: adjust_unread_counters(session.connection(), deltas))
+    return changed_by_user
+
+
+class NotificationOutbox:
+    """Worker que drena las notificaciones pendientes por lotes"""
+
+    def __init__(self, sender: NotificationSender = log_sender):
+        self.sender = sender
+        self.batch_size = settings.NOTIFICATIONS_BATCH_SIZE
+        self.poll_seconds = settings.NOTIFICATIONS_POLL_SECONDS
+        self.max_attempts = settings.NOTIFICATIONS_MAX_ATTEMPTS
+        self.backoff_seconds = settings.NOTIFICATIONS_BACKOFF_SECONDS
+        self.backoff_max_seconds = settings.NOTIFICATIONS_BACKOFF_MAX_SECONDS
+        self.lease_seconds = settings.NOTIFICATIONS_LEASE_SECONDS
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self.sent = 0
+        self.failed = 0
+        self.dead = 0
+
+    def set_sender(self, sender: NotificationSender):
+        self.sender = sender
+
+    def wake(self):
+        """Despierta al worker tras encolar notificaciones"""
+        if self._wake is not None:
+            self._wake.set()
+
+    def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                processed = await self.drain_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error en el worker de notificaciones: {e}")
+                processed = 0
+
+            # Con el lote lleno probablemente quedan más: seguir sin esperar
+            if processed >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def _backoff(self, intentos: int) -> timedelta:
+        return timedelta(seconds=min(self.backoff_seconds * 2 ** (intentos - 1), self.backoff_max_seconds))
+
+    async def _claim_batch(self, db: AsyncSession) -> List[NotificationDB]:
+        now = datetime.now()
+        ids = list(await db.scalars(
+            select(NotificationDB.Id)
+            .where(NotificationDB.enviada_en.is_(None), NotificationDB.proximo_intento <= now)
+            .order_by(NotificationDB.proximo_intento, NotificationDB.Id)
+            .limit(self.batch_size)
+        ))
+        if not ids:
+            return []
+        # Solo se quedan las filas que nadie reclamó entre el SELECT y el UPDATE
+        claimed = await db.scalars(
+            update(NotificationDB)
+            .where(
+                NotificationDB.Id.in_(ids),
+                NotificationDB.enviada_en.is_(None),
+                NotificationDB.proximo_intento <= now,
+            )
+            .values(proximo_intento=now + timedelta(seconds=self.lease_seconds))
+            .returning(NotificationDB)
+            .execution_options(synchronize_session=False)
+        )
+        batch = list(claimed)
+        await db.commit()
+        return batch
+
+    async def _send(self, notification: NotificationDB):
+        """Envía una notificación; devuelve (entregada, error)"""
+        try:
+            return bool(await self.sender(notification)), None
+        except Exception as e:
+            return False, str(e) or e.__class__.__name__
+
+    async def drain_once(self) -> int:
+        """Procesa un lote de pendientes; devuelve cuántas se tomaron"""
+        from database import AsyncSessionLocal
+
+        async with AsyncSessionLocal() as db:
+            batch = await self._claim_batch(db)
+            if not batch:
+                return 0
+
+            results = await asyncio.gather(*(self._send(n) for n in batch))
+
+            now = datetime.now()
+            changes: List[Dict] = []
+            delivered_ids: List[int] = []
+            for notification, (delivered, error) in zip(batch, results):
+                if error is None:
+                    self.sent += 1
+                    if delivered:
+                        delivered_ids.append(notification.Id)
+                    changes.append({"Id": notification.Id, "enviada_en": now, "ultimo_error": None})
+                    continue
+                intentos = notification.intentos + 1
+                self.failed += 1
+                change = {"Id": notification.Id, "intentos": intentos, "ultimo_error": error[:500]}
+                if intentos >= self.max_attempts:
+                    # Se da por perdida: queda registrada con el último error
+                    self.dead += 1
+                    change["enviada_en"] = now
+                else:
+                    change["proximo_intento"] = now + self._backoff(intentos)
+                changes.append(change)
+
+            await db.execute(update(NotificationDB), changes)
+            # Estado solo pasa a entregada: no pisa una marca hecha por el usuario
+            await set_notifications_state(db, delivered_ids, True)
+            await db.commit()
+            return len(batch)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "dead": self.dead,
+        }
+
+
+# Por defecto las notificaciones se entregan por el hub de tiempo real
+notification_outbox = NotificationOutbox(sender=hub_sender)
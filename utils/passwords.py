@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Política de hashing de contraseñas.
+
+El esquema y su coste se configuran en ``utils.config.Settings``
+(``PASSWORD_SCHEME``, ``BCRYPT_ROUNDS``, ``ARGON2_*``) y se aplican con un
+``CryptContext`` de passlib. Los hashes con otro esquema o con otros
+parámetros siguen verificándose, pero se marcan como obsoletos: al iniciar
+sesión ``verify_password`` devuelve el hash recalculado con la política actual
+para guardarlo (rehash transparente).
+
+argon2 requiere el paquete opcional ``argon2-cffi``.
+
+El modo de línea de comandos mide el coste en esta máquina y recomienda el
+valor que se acerca a una latencia objetivo:
+
+Uso:
+    python utils/passwords.py --calibrate --target-ms 250
+    python utils/passwords.py --calibrate --scheme argon2 --target-ms 300
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+from typing import Optional, Tuple
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passlib.context import CryptContext
+
+from utils.config import settings
+
+# passlib 1.7 intenta leer bcrypt.__about__, que ya no existe en bcrypt 4, y
+# registra la excepción como aviso aunque el backend funciona correctamente
+logging.getLogger("passlib.handlers.bcrypt").setLevel(logging.ERROR)
+
+SUPPORTED_SCHEMES = ("bcrypt", "argon2")
+
+
+def build_context(scheme: str = None, **params) -> CryptContext:
+    """CryptContext con el esquema indicado como principal; el resto solo verifica"""
+    scheme = scheme or settings.PASSWORD_SCHEME
+    if scheme not in SUPPORTED_SCHEMES:
+        raise ValueError(f"Esquema de hashing no soportado: {scheme}")
+    options = {
+        "bcrypt__rounds": params.get("bcrypt_rounds", settings.BCRYPT_ROUNDS),
+        "argon2__time_cost": params.get("argon2_time_cost", settings.ARGON2_TIME_COST),
+        "argon2__memory_cost": params.get("argon2_memory_cost", settings.ARGON2_MEMORY_COST),
+        "argon2__parallelism": params.get("argon2_parallelism", settings.ARGON2_PARALLELISM),
+    }
+    return CryptContext(
+        schemes=[scheme] + [s for s in SUPPORTED_SCHEMES if s != scheme],
+        default=scheme,
+        deprecated="auto",
+        **options,
+    )
+
+
+pwd_context = build_context()
+
+
+def hash_password(raw_password: str) -> str:
+    """Hash con la política actual (función de módulo para poder usarla en un pool de procesos)"""
+    return pwd_context.hash(raw_password)
+
+
+def verify_password(raw_password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verifica la contraseña. Devuelve (válida, nuevo_hash); nuevo_hash no es
+    None cuando el hash guardado usa parámetros obsoletos y debe reemplazarse.
+    """
+    if not password_hash:
+        return False, None
+    return pwd_context.verify_and_update(raw_password, password_hash)
+
+
+def _measure(context: CryptContext, samples: int) -> float:
+    """Mediana en segundos de un hash completo"""
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        context.hash("calibracion-de-coste")
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def calibrate(scheme: str, target_ms: float, samples: int = 3):
+    """Mide costes crecientes y devuelve el mayor que no supera la latencia objetivo"""
+    target = target_ms / 1000
+    if scheme == "bcrypt":
+        param, values = "BCRYPT_ROUNDS", range(4, 20)
+        make = lambda value: build_context("bcrypt", bcrypt_rounds=value)
+    else:
+        param, values = "ARGON2_TIME_COST", range(1, 20)
+        make = lambda value: build_context("argon2", argon2_time_cost=value)
+
+    # Primer hash descartado: carga del backend y calentamiento
+    make(values[0]).hash("calentamiento")
+    best = None
+    for value in values:
+        elapsed = _measure(make(value), samples)
+        print(f"   {param}={value}: {elapsed * 1000:.1f} ms")
+        if elapsed > target:
+            break
+        best = value
+    return param, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrar el coste del hashing de contraseñas")
+    parser.add_argument("--calibrate", action="store_true", help="Medir y recomendar el coste")
+    parser.add_argument("--scheme", choices=SUPPORTED_SCHEMES, default=settings.PASSWORD_SCHEME)
+    parser.add_argument("--target-ms", type=float, default=250, help="Latencia objetivo por hash")
+    parser.add_argument("--samples", type=int, default=3, help="Mediciones por valor")
+    args = parser.parse_args()
+
+    if not args.calibrate:
+        print(f"Esquema actual: {settings.PASSWORD_SCHEME}")
+        print(f"   Hash de ejemplo: {hash_password('ejemplo')}")
+        return
+
+    print(f"⏱️  Calibrando {args.scheme} para ~{args.target_ms:.0f} ms por hash...")
+    param, best = calibrate(args.scheme, args.target_ms, args.samples)
+    if best is None:
+        print("❌ Ni el coste mínimo cumple la latencia objetivo en esta máquina.")
+        sys.exit(1)
+    print()
+    print("✅ Configuración recomendada:")
+    print(f"   PASSWORD_SCHEME={args.scheme}")
+    print(f"   {param}={best}")
+
+
+if __name__ == "__main__":
+    main()
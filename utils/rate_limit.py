@@ -0,0 +1,110 @@
+"""
+Limitador de intentos (token bucket).
+
+Cada clave (p. ej. ``login:ip:1.2.3.4`` o ``login:email:a@b.com``) tiene un
+cubo con ``capacity`` fichas que se rellena a ``refill_per_second``; cada
+intento consume una ficha y sin fichas se responde con el tiempo que falta
+para la siguiente. La comprobación es O(1) y no toca la base de datos, así
+que los intentos rechazados no llegan a bcrypt.
+
+El backend por defecto vive en memoria del proceso (cada worker limita por su
+cuenta). Para compartir los contadores entre workers basta con implementar
+``RateLimitBackend`` (p. ej. sobre Redis) y registrarlo con
+``set_rate_limit_backend``.
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict
+
+from cachetools import TLRUCache
+
+from utils.config import settings
+from utils.ip_filter import allowed_networks
+
+
+class RateLimitBackend(ABC):
+    """Interfaz de un backend de token buckets"""
+
+    @abstractmethod
+    async def hit(self, key: str, capacity: float, refill_per_second: float) -> float:
+        """Consume una ficha; devuelve 0 si se permite o los segundos hasta poder reintentar"""
+
+    @abstractmethod
+    async def reset(self, key: str):
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class InMemoryRateLimiter(RateLimitBackend):
+    """
+    Cubos en memoria. Cada entrada caduca cuando el cubo estaría lleno de
+    nuevo (equivale a no tener entrada), y ``maxsize`` acota la memoria ante
+    ataques con claves aleatorias.
+    """
+
+    def __init__(self, maxsize: int):
+        self._buckets = TLRUCache(maxsize=maxsize, ttu=lambda key, bucket, now: bucket[2], timer=time.monotonic)
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+
+    async def hit(self, key: str, capacity: float, refill_per_second: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_per_second)
+            if tokens < 1:
+                self.limited += 1
+                return (1 - tokens) / refill_per_second
+            tokens -= 1
+            full_at = now + (capacity - tokens) / refill_per_second
+            self._buckets[key] = (tokens, now, full_at)
+            self.allowed += 1
+            return 0.0
+
+    async def reset(self, key: str):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "keys": len(self._buckets),
+                "allowed": self.allowed,
+                "limited": self.limited,
+            }
+
+
+class _DisabledRateLimiter(RateLimitBackend):
+    async def hit(self, key: str, capacity: float, refill_per_second: float) -> float:
+        return 0.0
+
+    async def reset(self, key: str):
+        pass
+
+
+def _build_default_backend() -> RateLimitBackend:
+    if not settings.LOGIN_RATE_LIMIT_ENABLED:
+        return _DisabledRateLimiter()
+    return InMemoryRateLimiter(maxsize=settings.RATE_LIMIT_MAXSIZE)
+
+
+rate_limiter: RateLimitBackend = _build_default_backend()
+
+
+def set_rate_limit_backend(backend: RateLimitBackend):
+    """Reemplaza el backend (p. ej. por uno compartido entre workers)"""
+    global rate_limiter
+    rate_limiter = backend
+
+
+def get_rate_limiter() -> RateLimitBackend:
+    return rate_limiter
+
+
+def is_allowlisted(ip: str) -> bool:
+    """¿Pertenece la IP a alguno de los ALLOWED_CIDRS? (exentas del límite)"""
+    return ip in allowed_networks
@@ -0,0 +1,118 @@
+"""
+Sonda de disponibilidad (readiness) para el balanceador de carga.
+
+A diferencia de ``/health`` (el proceso responde), ``/ready`` indica si este
+worker puede aceptar más tráfico. Responde 503 cuando:
+
+- la base de datos no responde a un ``SELECT 1`` en ``READY_DB_TIMEOUT_SECONDS``;
+- el pool de conexiones de las rutas está agotado;
+- la cola de hashing supera ``READY_HASH_QUEUE_RATIO`` de su capacidad;
+- el último retardo medido del event loop supera ``READY_MAX_LOOP_LAG_MS``;
+- el proceso se está apagando.
+
+El ping a la base de datos se cachea ``READY_CACHE_SECONDS`` y las sondas
+concurrentes comparten el mismo ping en curso, así que muchas sondas por
+segundo generan como mucho una consulta por intervalo y nunca ocupan más de
+una conexión del pool. El resto de comprobaciones son lecturas en memoria.
+"""
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+
+from utils.config import settings
+
+
+class ReadinessProbe:
+    """Comprobaciones de disponibilidad con el ping a la base de datos cacheado"""
+
+    def __init__(self, cache_seconds: float, db_timeout: float, hash_queue_ratio: float, max_loop_lag: float):
+        self.cache_seconds = cache_seconds
+        self.db_timeout = db_timeout
+        self.hash_queue_ratio = hash_queue_ratio
+        self.max_loop_lag = max_loop_lag
+        self.shutting_down = False
+        self._db_result: Optional[Dict[str, Any]] = None
+        self._db_checked_at = 0.0
+        self._db_ping: Optional[asyncio.Future] = None
+        self.db_pings = 0
+
+    async def _ping_db(self) -> Dict[str, Any]:
+        from database import async_engine
+
+        self.db_pings += 1
+        started = time.perf_counter()
+        try:
+            # La espera de una conexión libre cuenta dentro del timeout
+            async with asyncio.timeout(self.db_timeout):
+                async with async_engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+            return {"ok": True, "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
+        except TimeoutError:
+            return {"ok": False, "error": f"Sin respuesta en {self.db_timeout} s"}
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+
+    async def check_db(self) -> Dict[str, Any]:
+        """Resultado del último ping si es reciente; si no, un ping compartido"""
+        now = time.monotonic()
+        if self._db_result is not None and now - self._db_checked_at < self.cache_seconds:
+            return {**self._db_result, "cached": True}
+        if self._db_ping is None:
+            self._db_ping = asyncio.ensure_future(self._ping_db())
+            try:
+                self._db_result = await asyncio.shield(self._db_ping)
+                self._db_checked_at = time.monotonic()
+            finally:
+                self._db_ping = None
+            return {**self._db_result, "cached": False}
+        # Otra sonda ya está haciendo el ping: se espera a su resultado
+        return {**await asyncio.shield(self._db_ping), "cached": True}
+
+    async def check(self) -> Dict[str, Any]:
+        from database import pool_stats
+        from rooms.availability_index import availability_index
+        from utils.auth import token_cache_stats
+        from utils.hashing import password_hasher
+        from utils.loop_monitor import loop_monitor
+        from utils.user_cache import get_user_cache
+
+        db = await self.check_db()
+        pools = pool_stats()
+        hashing = password_hasher.stats()
+        loop = loop_monitor.stats()
+
+        failures = []
+        if self.shutting_down:
+            failures.append("shutting_down")
+        if not db["ok"]:
+            failures.append("database")
+        if pools["async"].get("saturated"):
+            failures.append("db_pool")
+        if hashing["queue_depth"] >= max(1, hashing["max_queue"] * self.hash_queue_ratio):
+            failures.append("hashing_queue")
+        if self.max_loop_lag and loop["running"] and loop["last_lag_ms"] >= self.max_loop_lag * 1000:
+            failures.append("event_loop")
+
+        return {
+            "ready": not failures,
+            "failures": failures,
+            "database": db,
+            "pools": pools,
+            "hashing": {key: hashing[key] for key in ("workers", "in_flight", "queue_depth", "max_queue", "rejected")},
+            "event_loop": {key: loop[key] for key in ("running", "last_lag_ms", "max_lag_ms", "stalls")},
+            "caches": {
+                "tokens": token_cache_stats(),
+                "users": get_user_cache().stats(),
+                "availability_index": availability_index.stats(),
+            },
+        }
+
+
+readiness_probe = ReadinessProbe(
+    cache_seconds=settings.READY_CACHE_SECONDS,
+    db_timeout=settings.READY_DB_TIMEOUT_SECONDS,
+    hash_queue_ratio=settings.READY_HASH_QUEUE_RATIO,
+    max_loop_lag=settings.READY_MAX_LOOP_LAG_MS / 1000,
+)
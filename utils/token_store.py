@@ -0,0 +1,174 @@
+"""
+Almacén de revocación y rotación de refresh tokens.
+
+Cada refresh token lleva un ``jti`` propio y el ``fam`` (familia) de la sesión
+en la que se emitió. Al refrescar, el ``jti`` presentado se consume y se emite
+uno nuevo de la misma familia; si un ``jti`` ya consumido vuelve a aparecer se
+asume que el token fue robado y se revoca la familia entera. El logout revoca
+la familia.
+
+La comprobación es una búsqueda en un diccionario en memoria (O(1)) y cada
+entrada caduca junto con el último token al que puede afectar, como mucho
+``REFRESH_TOKEN_EXPIRE_DAYS`` después. Los access tokens no pasan por aquí:
+siguen validándose sin E/S y una sesión cerrada deja de poder refrescarse,
+pero su access token vive hasta su expiración (minutos).
+
+Con ``REFRESH_STORE_PERSIST`` las revocaciones se guardan además en la tabla
+``revoked_tokens``: se cargan al arrancar, otros workers leen las familias
+revocadas cada ``REFRESH_STORE_SYNC_SECONDS`` y el índice único sobre la clave
+impide que dos workers consuman el mismo ``jti``. La lectura periódica no usa
+el ``Id`` como marca (en PostgreSQL los ids de transacciones concurrentes no se
+confirman en orden) sino ``creado_en``, releyendo una ventana de
+``REFRESH_STORE_SYNC_OVERLAP_SECONDS`` antes de la última fila vista para no
+perder las que se confirmaron tarde.
+"""
+import asyncio
+import heapq
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from utils.config import settings
+
+
+class RefreshTokenStore:
+    """Claves revocadas ('jti:<id>' o 'fam:<id>') con su instante de expiración"""
+
+    def __init__(self, persist: bool = False, sync_seconds: float = 5, sync_overlap: float = 30):
+        self.persist = persist
+        self.sync_seconds = sync_seconds
+        self.sync_overlap = sync_overlap
+        self._revoked: Dict[str, float] = {}
+        self._expirations: List[Tuple[float, str]] = []
+        self._last_seen: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+        self.rotations = 0
+        self.reuse_detected = 0
+
+    def _remember(self, key: str, exp: float):
+        if exp > self._revoked.get(key, 0):
+            self._revoked[key] = exp
+            heapq.heappush(self._expirations, (exp, key))
+
+    def _purge(self, now: float):
+        while self._expirations and self._expirations[0][0] <= now:
+            exp, key = heapq.heappop(self._expirations)
+            if self._revoked.get(key) == exp:
+                del self._revoked[key]
+
+    def is_revoked(self, fam: str) -> bool:
+        """¿Está cerrada la sesión? (el jti se comprueba al rotar)"""
+        now = time.time()
+        self._purge(now)
+        return self._revoked.get(f"fam:{fam}", 0) > now
+
+    async def _persist(self, key: str, exp: float) -> bool:
+        """Guarda la revocación; False si otro worker ya la había guardado"""
+        from database import AsyncSessionLocal
+        from models import RevokedTokenDB
+
+        async with AsyncSessionLocal() as db:
+            try:
+                await db.execute(insert(RevokedTokenDB).values(clave=key, expira_en=datetime.fromtimestamp(exp)))
+                await db.commit()
+                return True
+            except IntegrityError:
+                await db.rollback()
+                return False
+
+    async def rotate(self, jti: str, fam: str, exp: float) -> bool:
+        """
+        Consume el ``jti`` de un refresh token. Devuelve False si ya estaba
+        consumido (reutilización), en cuyo caso revoca toda la familia.
+        """
+        key = f"jti:{jti}"
+        # El diccionario se consulta y actualiza sin ceder el event loop
+        fresh = self._revoked.get(key, 0) <= time.time()
+        if fresh:
+            self._remember(key, exp)
+            if self.persist:
+                fresh = await self._persist(key, exp)
+        if fresh:
+            self.rotations += 1
+            return True
+        self.reuse_detected += 1
+        await self.revoke_family(fam)
+        return False
+
+    async def revoke_family(self, fam: str):
+        """Revoca todos los refresh tokens de una sesión"""
+        key = f"fam:{fam}"
+        exp = time.time() + settings.REFRESH_TOKEN_EXPIRE_DAYS * 86400
+        self._remember(key, exp)
+        if self.persist:
+            await self._persist(key, exp)
+
+    async def sync(self, db):
+        """
+        Incorpora las familias revocadas desde la última lectura. Los ``jti``
+        consumidos no hace falta leerlos: el índice único ya impide reutilizarlos
+        desde otro worker. Releer la ventana de solapamiento es inocuo porque
+        ``_remember`` es idempotente.
+        """
+        from models import RevokedTokenDB
+
+        query = (
+            select(RevokedTokenDB.clave, RevokedTokenDB.expira_en, RevokedTokenDB.creado_en)
+            .where(RevokedTokenDB.clave.startswith("fam:"), RevokedTokenDB.expira_en > datetime.now())
+        )
+        if self._last_seen is not None:
+            query = query.where(RevokedTokenDB.creado_en >= self._last_seen - timedelta(seconds=self.sync_overlap))
+        for key, expira_en, creado_en in await db.execute(query):
+            self._remember(key, expira_en.timestamp())
+            if self._last_seen is None or creado_en > self._last_seen:
+                self._last_seen = creado_en
+
+    async def load(self, db):
+        """Borra las revocaciones caducadas y carga las vigentes"""
+        from models import RevokedTokenDB
+
+        await db.execute(delete(RevokedTokenDB).where(RevokedTokenDB.expira_en <= datetime.now()))
+        await db.commit()
+        await self.sync(db)
+
+    def start(self):
+        if self.persist and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        from database import AsyncSessionLocal
+
+        while True:
+            await asyncio.sleep(self.sync_seconds)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.sync(db)
+            except Exception as e:
+                print(f"Error al sincronizar las revocaciones de tokens: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "revoked": len(self._revoked),
+            "rotations": self.rotations,
+            "reuse_detected": self.reuse_detected,
+            "persist": self.persist,
+        }
+
+
+refresh_token_store = RefreshTokenStore(
+    persist=settings.REFRESH_STORE_PERSIST,
+    sync_seconds=settings.REFRESH_STORE_SYNC_SECONDS,
+    sync_overlap=settings.REFRESH_STORE_SYNC_OVERLAP_SECONDS,
+)
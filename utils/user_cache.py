@@ -0,0 +1,145 @@
+"""
+Caché de usuarios autenticados.
+
+``get_current_user`` se ejecuta en cada petición autenticada; en lugar de abrir
+una sesión y hacer un ``SELECT`` cada vez, se guarda una instantánea del
+usuario (``models.UserPrincipal``) indexada por id, con TTL y expulsión LRU.
+
+El backend por defecto vive en memoria del proceso. Para compartir la caché
+entre workers basta con implementar ``UserCacheBackend`` (p. ej. sobre Redis)
+y registrarlo con ``set_user_cache_backend``. Los valores son diccionarios
+serializables a JSON.
+"""
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+from cachetools import TTLCache
+
+from utils.config import settings
+
+
+class UserCacheBackend(ABC):
+    """Interfaz de un backend de caché de usuarios"""
+
+    @abstractmethod
+    async def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def set(self, user_id: int, data: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    async def delete(self, user_id: int):
+        ...
+
+    @abstractmethod
+    async def clear(self):
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class InMemoryUserCache(UserCacheBackend):
+    """Caché TTL + LRU en memoria del proceso"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            data = self._cache.get(user_id)
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return data
+
+    async def set(self, user_id: int, data: Dict[str, Any]):
+        with self._lock:
+            self._cache[user_id] = data
+
+    async def delete(self, user_id: int):
+        with self._lock:
+            self._cache.pop(user_id, None)
+
+    async def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def discard(self, user_id: int):
+        with self._lock:
+            self._cache.pop(user_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._cache),
+                "maxsize": self._cache.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+class _DisabledUserCache(UserCacheBackend):
+    """Backend nulo usado cuando la caché está desactivada"""
+
+    async def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        return None
+
+    async def set(self, user_id: int, data: Dict[str, Any]):
+        pass
+
+    async def delete(self, user_id: int):
+        pass
+
+    async def clear(self):
+        pass
+
+
+def _default_backend() -> UserCacheBackend:
+    if settings.USER_CACHE_TTL_SECONDS <= 0:
+        return _DisabledUserCache()
+    return InMemoryUserCache(
+        maxsize=settings.USER_CACHE_MAXSIZE,
+        ttl=settings.USER_CACHE_TTL_SECONDS,
+    )
+
+
+user_cache: UserCacheBackend = _default_backend()
+
+
+def set_user_cache_backend(backend: UserCacheBackend):
+    """Reemplaza el backend de caché (p. ej. por uno compartido)"""
+    global user_cache
+    user_cache = backend
+
+
+def get_user_cache() -> UserCacheBackend:
+    return user_cache
+
+
+async def invalidate_user(user_id: int):
+    """Elimina un usuario de la caché tras cambiar su rol o autorización"""
+    await user_cache.delete(user_id)
+
+
+def invalidate_user_sync(user_id: int):
+    """Invalidación desde código síncrono (eventos del ORM, scripts)"""
+    if isinstance(user_cache, InMemoryUserCache):
+        user_cache.discard(user_id)
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        asyncio.run(invalidate_user(user_id))
+    else:
+        loop.create_task(invalidate_user(user_id))